@@ -0,0 +1,268 @@
+"""
+Throughput benchmark and golden-output regression check for the
+ExtractFromPDFs.py field extractors, over the saved notice texts (TextStore).
+
+Every document goes through normalize_pdf_text, build_section_index and each
+extractor in EXTRACTORS, one process, one document at a time. The golden
+snapshot holds every extractor's output and the sha256 of the
+normalize_pdf_text output. The helpers
+called inside extract_lots (parse_winner_block, parse_criteria_section, ...)
+are timed too, summed per document. Reported per stage: docs/s and
+p50/p95/p99 latency, plus the slowest documents overall.
+
+  python BenchExtractors.py --write-golden      # record the current outputs
+  python BenchExtractors.py                     # benchmark + diff against them
+  python BenchExtractors.py --ids 1269355,1943455 --json bench.json
+  python BenchExtractors.py --dir pdf_text      # the versioned corpus, no TextStore needed
+
+The snapshot (extract_golden.json.gz next to this file) is committed, so an
+optimisation can be diffed against it on any checkout.
+
+A non-empty golden diff exits with status 1.
+"""
+
+import os
+import sys
+import gzip
+import json
+import math
+import time
+import hashlib
+import pathlib
+import logging
+import argparse
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import ExtractFromPDFs as E
+import TextStore
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+BENCH_GOLDEN = os.getenv("BENCH_GOLDEN") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "extract_golden.json.gz"
+)
+
+# helpers called from inside the extractors, timed via their module globals
+NESTED = [
+    "parse_winner_block",
+    "parse_criteria_section",
+    "parse_bendra_informacija",
+    "parse_strateginis_vp",
+]
+
+
+def percentile(sorted_vals: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+def _instrument(doc_times: Dict[str, float]):
+    """Wrap the NESTED helpers so each call adds its duration to doc_times[name]."""
+    originals = {}
+    for name in NESTED:
+        fn = getattr(E, name)
+        originals[name] = fn
+
+        def timed(*args, _fn=fn, _name=name, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return _fn(*args, **kwargs)
+            finally:
+                doc_times[_name] = doc_times.get(_name, 0.0) + time.perf_counter() - t0
+
+        setattr(E, name, timed)
+    return originals
+
+def _restore(originals: Dict[str, Any]):
+    for name, fn in originals.items():
+        setattr(E, name, fn)
+
+# -------------------------------------------------------
+# Benchmark
+# -------------------------------------------------------
+
+def run(items: Iterable[Tuple[str, str]]) -> Tuple[Dict[str, List[Tuple[float, str]]], Dict[str, Dict[str, Any]], float]:
+    """
+    Extract every (notice_id, text). Returns ({stage: [(seconds, notice_id)]},
+    {notice_id: {extractor: fields, "normalize_pdf_text": sha256}}, wall seconds).
+    """
+    timings: Dict[str, List[Tuple[float, str]]] = {}
+    outputs: Dict[str, Dict[str, Any]] = {}
+    doc_times: Dict[str, float] = {}
+    originals = _instrument(doc_times)
+    t_start = time.perf_counter()
+    try:
+        for notice_id, text in items:
+            doc_times.clear()
+            t_doc = time.perf_counter()
+
+            t0 = time.perf_counter()
+            normalized = E.normalize_pdf_text(text)
+            doc_times["normalize_pdf_text"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            index = E.build_section_index(text)
+            doc_times["build_section_index"] = time.perf_counter() - t0
+
+            out: Dict[str, Any] = {"normalize_pdf_text": hashlib.sha256(normalized.encode("utf-8")).hexdigest()}
+            for name, fn in E.EXTRACTORS.items():
+                t0 = time.perf_counter()
+                out[name] = fn(notice_id, text, index)
+                doc_times[name] = time.perf_counter() - t0
+            doc_times["document"] = time.perf_counter() - t_doc
+
+            outputs[notice_id] = out
+            for stage, secs in doc_times.items():
+                timings.setdefault(stage, []).append((secs, notice_id))
+    finally:
+        _restore(originals)
+    return timings, outputs, time.perf_counter() - t_start
+
+def summarize(timings: Dict[str, List[Tuple[float, str]]], docs: int, wall: float, top: int) -> Dict[str, Any]:
+    stages = {}
+    for stage, vals in timings.items():
+        secs = sorted(v for v, _ in vals)
+        total = sum(secs)
+        stages[stage] = {
+            "docs": len(secs),
+            "total_s": round(total, 4),
+            "docs_per_s": round(len(secs) / total, 1) if total else None,
+            "p50_ms": round(percentile(secs, 50) * 1000, 3),
+            "p95_ms": round(percentile(secs, 95) * 1000, 3),
+            "p99_ms": round(percentile(secs, 99) * 1000, 3),
+            "max_ms": round(secs[-1] * 1000, 3),
+        }
+    slowest = sorted(timings.get("document", []), reverse=True)[:top]
+    return {
+        "docs": docs,
+        "wall_s": round(wall, 3),
+        "docs_per_s": round(docs / wall, 1) if wall else None,
+        "stages": stages,
+        "slowest": [{"notice_id": nid, "ms": round(s * 1000, 3)} for s, nid in slowest],
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['docs']} documents in {report['wall_s']:.2f}s ({report['docs_per_s']} docs/s)\n")
+    print(f"{'stage':<26}{'docs':>7}{'docs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, st in sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"{stage:<26}{st['docs']:>7}{st['docs_per_s'] or 0:>10}{st['p50_ms']:>10.2f}"
+              f"{st['p95_ms']:>10.2f}{st['p99_ms']:>10.2f}{st['max_ms']:>10.2f}")
+    print("\nslowest documents:")
+    for s in report["slowest"]:
+        print(f"  {s['notice_id']:<12}{s['ms']:>10.2f} ms")
+
+# -------------------------------------------------------
+# Golden snapshot
+# -------------------------------------------------------
+
+def iter_dir(text_dir: str, ids: Optional[List[str]] = None) -> Iterable[Tuple[str, str]]:
+    """(notice_id, text) from a directory of <notice_id>.txt files, in notice_id order."""
+    paths = ([pathlib.Path(text_dir, f"{i}.txt") for i in ids] if ids
+             else sorted(pathlib.Path(text_dir).glob("*.txt")))
+    for p in paths:
+        if p.exists():
+            yield p.stem, p.read_text(encoding="utf-8")
+
+def _canonical(outputs: Dict[str, Any]) -> Dict[str, Any]:
+    # JSON round trip: what is stored in the snapshot (and in jsonb) is what we compare
+    return json.loads(json.dumps(outputs, ensure_ascii=False, default=str))
+
+def write_golden(path: str, outputs: Dict[str, Any]):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(_canonical(outputs), f, ensure_ascii=False, sort_keys=True)
+
+def read_golden(path: str) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def _diff_paths(a: Any, b: Any, path: str, out: List[str], limit: int):
+    if len(out) >= limit:
+        return
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in sorted(set(a) | set(b)):
+            if k not in a or k not in b:
+                out.append(f"{path}/{k}: {'added' if k not in a else 'removed'}")
+            else:
+                _diff_paths(a[k], b[k], f"{path}/{k}", out, limit)
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            _diff_paths(x, y, f"{path}[{i}]", out, limit)
+    elif a != b:
+        out.append(f"{path}: {json.dumps(a, ensure_ascii=False)[:120]} -> {json.dumps(b, ensure_ascii=False)[:120]}")
+
+def diff_golden(golden: Dict[str, Any], outputs: Dict[str, Any], per_doc: int = 5) -> Dict[str, List[str]]:
+    """{notice_id: [changed paths]} for documents present in both whose outputs differ."""
+    current = _canonical(outputs)
+    diffs = {}
+    for notice_id, out in current.items():
+        if notice_id in golden and golden[notice_id] != out:
+            paths: List[str] = []
+            _diff_paths(golden[notice_id], out, "", paths, per_doc)
+            diffs[notice_id] = paths
+    return diffs
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the PDF field extractors over the stored texts.")
+    ap.add_argument("--ids", help="comma-separated notice_ids (default: every text)")
+    ap.add_argument("--limit", type=int, default=0, help="only the first N texts")
+    ap.add_argument("--dir", help="read <notice_id>.txt files from this directory instead of TEXT_STORE")
+    ap.add_argument("--top", type=int, default=10, help="slowest documents to list")
+    ap.add_argument("--golden", default=BENCH_GOLDEN, help="golden snapshot (.json.gz)")
+    ap.add_argument("--write-golden", action="store_true", help="store the outputs as the new golden snapshot")
+    ap.add_argument("--json", dest="json_out", help="also write the report as JSON")
+    args = ap.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    ids = [i.strip() for i in args.ids.split(",") if i.strip()] if args.ids else None
+    if args.dir:
+        source = args.dir
+        timings, outputs, wall = run(itertools.islice(iter_dir(args.dir, ids), args.limit or None))
+    else:
+        store = TextStore.open_store()
+        source = store["path"]
+        timings, outputs, wall = run(itertools.islice(TextStore.iter_texts(store, ids), args.limit or None))
+        TextStore.close_store(store)
+    if not outputs:
+        print(f"No texts in {source}.")
+        return 1
+    report = summarize(timings, len(outputs), wall, args.top)
+    print_report(report)
+
+    status = 0
+    if args.write_golden:
+        golden = read_golden(args.golden) if os.path.exists(args.golden) else {}
+        golden.update(_canonical(outputs))
+        write_golden(args.golden, golden)
+        print(f"\nGolden snapshot {args.golden}: {len(golden)} documents.")
+    elif os.path.exists(args.golden):
+        golden = read_golden(args.golden)
+        diffs = diff_golden(golden, outputs)
+        missing = sum(1 for nid in outputs if nid not in golden)
+        report["golden"] = {"path": args.golden, "changed": diffs, "not_in_golden": missing}
+        print(f"\nGolden {args.golden}: {len(diffs)} of {len(outputs) - missing} documents changed"
+              + (f", {missing} not in the snapshot" if missing else "") + ".")
+        for notice_id, paths_changed in sorted(diffs.items()):
+            print(f"  {notice_id}")
+            for p in paths_changed:
+                print(f"    {p}")
+        status = 1 if diffs else 0
+    else:
+        print(f"\nNo golden snapshot at {args.golden} (run with --write-golden).")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -4,19 +4,39 @@ import io
 import sys
 import time
 import json
-import random
+import queue
+import bisect
+import itertools
+import socket
+import signal
+import argparse
 import logging
+import hashlib
 import pathlib
-from typing import Optional, Tuple, List, Dict, Any
+import sqlite3
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple, List, Dict, Any, Iterable, Iterator
 from urllib.parse import urljoin
 
 import psycopg2
 import psycopg2.extras
 from psycopg2.extras import Json
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv, find_dotenv
 import unicodedata
 
+import RateLimit
+import PdfCache
+import ExtractMemo
+import TextStore
+import TextSearch
+
 # Load .env even if script runs from /backend
 load_dotenv(find_dotenv(usecwd=True))
 
@@ -24,14 +44,71 @@ load_dotenv(find_dotenv(usecwd=True))
 # Config
 # -------------------------
 BATCH_LIMIT = int(os.getenv("BATCH_LIMIT", "30"))
+
+# Work queue: several extractor processes can run side by side. Each claims
+# BATCH_LIMIT notices at a time (FOR UPDATE SKIP LOCKED) under a lease of
+# LEASE_SECONDS, renewed while the batch is running; a notice whose worker
+# died becomes claimable again when its lease expires. A run drains the queue
+# (MAX_BATCHES=0) or stops after MAX_BATCHES batches.
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "900"))
+MAX_BATCHES = int(os.getenv("MAX_BATCHES", "0"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+# Failed notices (download_failed, too_large, empty_text, exception, timeout) are retried
+# after RETRY_BASE_SECONDS, doubling per attempt up to RETRY_MAX_SECONDS; after
+# EXTRACT_MAX_ATTEMPTS failures they go to 'dead_letter' until `--requeue`.
+# Notices never tried come first in every batch.
+EXTRACT_MAX_ATTEMPTS = int(os.getenv("EXTRACT_MAX_ATTEMPTS", "6"))
+RETRY_BASE_SECONDS = int(os.getenv("RETRY_BASE_SECONDS", "3600"))
+RETRY_MAX_SECONDS = int(os.getenv("RETRY_MAX_SECONDS", str(7 * 24 * 3600)))
+# Results are buffered and written WRITE_BATCH rows per UPDATE ... FROM VALUES
+# statement, or whatever is buffered once WRITE_FLUSH_SECONDS have passed
+# (and always at the end of a batch)
+WRITE_BATCH = int(os.getenv("WRITE_BATCH", "200"))
+WRITE_FLUSH_SECONDS = float(os.getenv("WRITE_FLUSH_SECONDS", "5"))
 REQ_TIMEOUT = int(os.getenv("REQ_TIMEOUT", "25"))
 USER_AGENT = os.getenv(
     "USER_AGENT",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
 )
+# Normalized texts are kept in the packed TextStore (TEXT_STORE); a legacy
+# one-file-per-notice TEXT_DIR is imported with `python TextStore.py --migrate`
 TEXT_DIR = pathlib.Path(os.getenv("TEXT_DIR", "pdf_text"))
-TEXT_DIR.mkdir(parents=True, exist_ok=True)
+
+# Download stage: DOWNLOAD_WORKERS threads fetch PDFs concurrently (at most
+# PER_HOST_CONNECTIONS at once per host) and hand them to the parse/DB loop
+# through a queue of DOWNLOAD_QUEUE_SIZE entries (downloads pause when it is full)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+PER_HOST_CONNECTIONS = int(os.getenv("PER_HOST_CONNECTIONS", "4"))
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("DOWNLOAD_QUEUE_SIZE", "16"))
+
+# Parse stage: text extraction + field extractors run in a pool of
+# PARSE_WORKERS processes (1 = a thread in this process, unless a budget is set).
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Wall-clock budget per document (PDF text + all extractors), enforced in the
+# parse worker with SIGALRM, which also interrupts a regex mid-match. A notice
+# over budget is stored with status 'timeout' and the stage that was running.
+# Extractors slower than EXTRACT_SLOW_SECONDS are logged. 0 = no budget.
+EXTRACT_BUDGET_SECONDS = float(os.getenv("EXTRACT_BUDGET_SECONDS", "60"))
+EXTRACT_SLOW_SECONDS = float(os.getenv("EXTRACT_SLOW_SECONDS", "2"))
+# The batch loop's own deadline per parse task, for what SIGALRM cannot stop
+# (C code inside the PDF libraries): a task not done PARSE_HARD_SECONDS after
+# submission is stored as 'timeout' and the worker pool is replaced. Default:
+# two budgets (one task may be queued ahead of it) plus 30s; 0 = none.
+PARSE_HARD_SECONDS = float(os.getenv(
+    "PARSE_HARD_SECONDS", str(2 * EXTRACT_BUDGET_SECONDS + 30 if EXTRACT_BUDGET_SECONDS > 0 else 0)
+))
+
+# Downloads are streamed: bodies up to PARSE_SPILL_BYTES stay in memory, larger
+# ones go to a file (the PdfCache blob, or a temp file) that the parser opens
+# by path. PDFs above PDF_MAX_BYTES are not downloaded; linking HTML pages are
+# read up to HTML_MAX_BYTES.
+PARSE_SPILL_BYTES = int(os.getenv("PARSE_SPILL_BYTES", str(2 * 1024 * 1024)))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(200 * 1024 * 1024)))
+HTML_MAX_BYTES = int(os.getenv("HTML_MAX_BYTES", str(5 * 1024 * 1024)))
+CHUNK_BYTES = 64 * 1024
+SPILL_PREFIX = "pdfspill-"
 
 logging.basicConfig(
     level=logging.INFO,
@@ -52,46 +129,319 @@ def db_connect():
     return conn
 
 
-SELECT_SQL = """
-SELECT notice_id, pdf_urls
-FROM public.notices_stage
-WHERE (
-       buyer_name IS NULL
-    OR pirkimo_budas IS NULL
-    OR procedura_pagreitinta IS NULL
-    OR aprasymas IS NULL
-    OR lots IS NULL
-    OR viso_sutarciu_verte IS NULL   -- 👈 add this line
+# claimed_*: work queue leases; text_sha256 / extractor_versions: which text
+# and which extractor versions produced the stored fields (--backfill);
+# extraction_timings: seconds per parse stage/extractor of the last run;
+# extraction_attempts / next_attempt_at / extraction_error: failures in a row,
+# when to retry, and the last failure status (kept in 'dead_letter')
+SCHEMA_COLUMNS = {
+    "claimed_by": "TEXT",
+    "claimed_until": "TIMESTAMP",
+    "text_sha256": "TEXT",
+    "extractor_versions": "JSONB",
+    "extraction_timings": "JSONB",
+    "extraction_attempts": "INTEGER NOT NULL DEFAULT 0",
+    "next_attempt_at": "TIMESTAMP",
+    "extraction_error": "TEXT",
+}
+# The work queue (CLAIM_SQL)
+SCHEMA_INDEX = "notices_stage_extract_todo"
+SCHEMA_INDEX_SQL = f"""
+CREATE INDEX IF NOT EXISTS {SCHEMA_INDEX}
+    ON public.notices_stage (extraction_attempts, publish_date DESC NULLS LAST, notice_id)
+    WHERE pdf_urls IS NOT NULL
+      AND (extraction_status IS NULL OR extraction_status NOT IN ('ok', 'dead_letter'))
+"""
+
+# Work = every notice with a PDF link not extracted successfully yet (status
+# NULL or a failure status, not dead-lettered) that is due for a retry and
+# whose lease is free; notices with fewer failures first. A failure recorded
+# since the run started (%(since)s) is not retried in the same run. Claimed
+# rows are committed straight away, so other workers skip them.
+CLAIM_SQL = """
+WITH picked AS (
+    SELECT notice_id
+    FROM public.notices_stage
+    WHERE pdf_urls IS NOT NULL
+      AND (extraction_status IS NULL OR extraction_status NOT IN ('ok', 'dead_letter'))
+      AND (next_attempt_at IS NULL OR next_attempt_at <= NOW())
+      AND (claimed_until IS NULL OR claimed_until < NOW())
+      AND (last_extracted_at IS NULL OR last_extracted_at < %(since)s)
+    ORDER BY extraction_attempts, publish_date DESC NULLS LAST, notice_id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+),
+claimed AS (
+    UPDATE public.notices_stage AS n
+    SET claimed_by = %(worker)s,
+        claimed_until = NOW() + make_interval(secs => %(lease)s)
+    FROM picked
+    WHERE n.notice_id = picked.notice_id
+    RETURNING n.notice_id, n.pdf_urls, n.publish_date, n.extraction_attempts
 )
-  AND pdf_urls IS NOT NULL
-ORDER BY publish_date DESC NULLS LAST, notice_id;
+SELECT notice_id, pdf_urls
+FROM claimed
+ORDER BY extraction_attempts, publish_date DESC NULLS LAST, notice_id;
 """
 
 
-def get_work(conn, limit: int) -> List[dict]:
+def ensure_schema(conn):
+    """
+    Add the missing SCHEMA_COLUMNS and SCHEMA_INDEX. Checks the catalog first:
+    ALTER TABLE locks notices_stage against the scraper, so a migrated
+    database gets no DDL at all.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = 'notices_stage'"
+        )
+        have = {name for (name,) in cur.fetchall()}
+        missing = [name for name in SCHEMA_COLUMNS if name not in have]
+        if missing:
+            logging.info("Adding columns to notices_stage: %s.", ", ".join(missing))
+            cur.execute(
+                "ALTER TABLE public.notices_stage "
+                + ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {SCHEMA_COLUMNS[name]}" for name in missing)
+            )
+        cur.execute(
+            "SELECT 1 FROM pg_indexes WHERE schemaname = 'public' AND indexname = %s", (SCHEMA_INDEX,)
+        )
+        if cur.fetchone() is None:
+            logging.info("Creating index %s.", SCHEMA_INDEX)
+            cur.execute(SCHEMA_INDEX_SQL)
+
+
+def db_now(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT NOW()::timestamp")
+        return cur.fetchone()[0]
+
+
+def claim_work(conn, limit: int, since, worker: str = WORKER_ID) -> List[dict]:
+    """Claim up to `limit` notices for `worker` (newest first), skipping any tried after `since`."""
     with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(SELECT_SQL, (limit,))
+        cur.execute(CLAIM_SQL, {"limit": limit, "worker": worker, "lease": LEASE_SECONDS,
+                                "since": since})
         return cur.fetchall()
 
 
-def db_update_partial(conn, notice_id: str, fields: Dict[str, Any], status: str):
-    keys = [k for k, v in fields.items() if v is not None]
-    sets, params = [], []
-    for k in keys:
-        sets.append(f"{k} = %s")
-        v = fields[k]
-        # wrap JSON-ish values so psycopg2 knows how to send them
-        if isinstance(v, (dict, list)) or k in ("lots", "viso_sutarciu_verte"):
-            params.append(Json(v))
-        else:
-            params.append(v)
-    sets.append("extraction_status = %s")
-    params.append(status)
-    sets.append("last_extracted_at = NOW()")
-    sql = f"UPDATE public.notices_stage SET {', '.join(sets)} WHERE notice_id = %s"
-    params.append(notice_id)
+def renew_claims(conn, worker: str = WORKER_ID) -> int:
+    """Extend the lease on everything `worker` still holds."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE public.notices_stage SET claimed_until = NOW() + make_interval(secs => %s) "
+            "WHERE claimed_by = %s",
+            (LEASE_SECONDS, worker),
+        )
+        return cur.rowcount
+
+
+def release_claims(conn, worker: str = WORKER_ID) -> int:
+    """Drop whatever `worker` still holds (e.g. after an interrupted batch)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE public.notices_stage SET claimed_by = NULL, claimed_until = NULL "
+            "WHERE claimed_by = %s",
+            (worker,),
+        )
+        return cur.rowcount
+
+
+# Dead-lettered notices back to the queue as never tried (extraction_error is
+# kept), optionally only those that last failed with %(error)s / in %(ids)s
+REQUEUE_SQL = """
+UPDATE public.notices_stage
+SET extraction_status = NULL,
+    extraction_attempts = 0,
+    next_attempt_at = NULL
+WHERE extraction_status = 'dead_letter'
+  AND (%(error)s::text IS NULL OR extraction_error = %(error)s)
+  AND (%(ids)s::text[] IS NULL OR notice_id = ANY(%(ids)s::text[]))
+"""
+
+
+def requeue(ids: Optional[List[str]] = None, error: Optional[str] = None) -> int:
+    """Give dead-lettered notices a fresh set of EXTRACT_MAX_ATTEMPTS. Returns how many."""
+    conn = db_connect()
+    ensure_schema(conn)
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT extraction_error, COUNT(*) FROM public.notices_stage "
+            "WHERE extraction_status = 'dead_letter' GROUP BY 1 ORDER BY 2 DESC"
+        )
+        dead = cur.fetchall()
+        cur.execute(REQUEUE_SQL, {"error": error, "ids": ids})
+        n = cur.rowcount
+    conn.close()
+    logging.info("Dead-lettered: %s. Requeued %d.",
+                 ", ".join(f"{err} x{c}" for err, c in dead) or "none", n)
+    return n
+
+
+# Many notices in one statement. A NULL field keeps the stored value, so a
+# status-only item ({} fields) just sets extraction_status; only the columns
+# named in v.overwrite (re-run extractors, --reparse / --backfill) are set as
+# they are, NULL included. Writing a result also ends the notice's claim. A
+# failure status counts an attempt and schedules the retry (or dead-letters
+# the notice); 'ok' resets both. The retry settings are formatted in:
+# execute_values takes no other parameters.
+UPDATE_MANY_SQL = f"""
+UPDATE public.notices_stage AS n SET
+    pirkimo_budas         = CASE WHEN 'pirkimo_budas' = ANY(v.overwrite) THEN v.pirkimo_budas
+                                 ELSE COALESCE(v.pirkimo_budas, n.pirkimo_budas) END,
+    procedura_pagreitinta = CASE WHEN 'procedura_pagreitinta' = ANY(v.overwrite) THEN v.procedura_pagreitinta
+                                 ELSE COALESCE(v.procedura_pagreitinta, n.procedura_pagreitinta) END,
+    aprasymas             = CASE WHEN 'aprasymas' = ANY(v.overwrite) THEN v.aprasymas
+                                 ELSE COALESCE(v.aprasymas, n.aprasymas) END,
+    lots                  = CASE WHEN 'lots' = ANY(v.overwrite) THEN v.lots
+                                 ELSE COALESCE(v.lots, n.lots) END,
+    viso_sutarciu_verte   = CASE WHEN 'viso_sutarciu_verte' = ANY(v.overwrite) THEN v.viso_sutarciu_verte
+                                 ELSE COALESCE(v.viso_sutarciu_verte, n.viso_sutarciu_verte) END,
+    text_sha256           = COALESCE(v.text_sha256, n.text_sha256),
+    extractor_versions    = CASE WHEN v.extractor_versions IS NULL THEN n.extractor_versions
+                                 ELSE COALESCE(n.extractor_versions, '{{}}'::jsonb) || v.extractor_versions END,
+    extraction_timings    = CASE WHEN v.extraction_timings IS NULL THEN n.extraction_timings
+                                 ELSE (COALESCE(n.extraction_timings, '{{}}'::jsonb) - 'timed_out')
+                                      || v.extraction_timings END,
+    extraction_status     = CASE WHEN v.status = 'ok' THEN 'ok'
+                                 WHEN n.extraction_attempts + 1 >= {EXTRACT_MAX_ATTEMPTS} THEN 'dead_letter'
+                                 ELSE v.status END,
+    extraction_error      = CASE WHEN v.status = 'ok' THEN NULL ELSE v.status END,
+    extraction_attempts   = CASE WHEN v.status = 'ok' THEN 0 ELSE n.extraction_attempts + 1 END,
+    next_attempt_at       = CASE WHEN v.status = 'ok' OR n.extraction_attempts + 1 >= {EXTRACT_MAX_ATTEMPTS}
+                                 THEN NULL
+                                 ELSE NOW() + make_interval(secs => LEAST(
+                                     {RETRY_MAX_SECONDS}, {RETRY_BASE_SECONDS} * 2 ^ n.extraction_attempts))
+                                 END,
+    last_extracted_at     = NOW(),
+    claimed_by            = NULL,
+    claimed_until         = NULL
+FROM (VALUES %s) AS v (notice_id, pirkimo_budas, procedura_pagreitinta, aprasymas,
+                       lots, viso_sutarciu_verte, text_sha256, extractor_versions,
+                       extraction_timings, status, overwrite)
+WHERE n.notice_id = v.notice_id
+"""
+# Same for the offline re-extraction (--reparse / --backfill): a notice a
+# worker holds right now keeps its claim
+UPDATE_MANY_KEEP_CLAIMS_SQL = UPDATE_MANY_SQL.replace(
+    ",\n    claimed_by            = NULL,\n    claimed_until         = NULL\n", "\n"
+)
+assert UPDATE_MANY_KEEP_CLAIMS_SQL != UPDATE_MANY_SQL
+UPDATE_MANY_TEMPLATE = (
+    "(%s, %s::text, %s::boolean, %s::text, %s::jsonb, %s::jsonb, %s::text, %s::jsonb, %s::jsonb, %s::text,"
+    " %s::text[])"
+)
+
+
+def db_update_many(conn, items: List[Tuple[str, Dict[str, Any], str]], keep_claims: bool = False) -> int:
+    """
+    (notice_id, fields, status) for many notices in one UPDATE ... FROM VALUES.
+    Besides the extracted columns, fields may carry "text_sha256",
+    "extractor_versions" and "extraction_timings" (both merged into the
+    stored values), and "overwrite": the extracted columns to store even if
+    NULL. keep_claims leaves claimed_by / claimed_until alone.
+    Returns the number of rows updated.
+    """
+    if not items:
+        return 0
+    values = []
+    for notice_id, fields, status in items:
+        values.append((
+            notice_id,
+            fields.get("pirkimo_budas"),
+            fields.get("procedura_pagreitinta"),
+            fields.get("aprasymas"),
+            Json(fields["lots"]) if fields.get("lots") is not None else None,
+            Json(fields["viso_sutarciu_verte"]) if fields.get("viso_sutarciu_verte") is not None else None,
+            fields.get("text_sha256"),
+            Json(fields["extractor_versions"]) if fields.get("extractor_versions") is not None else None,
+            Json(fields["extraction_timings"]) if fields.get("extraction_timings") is not None else None,
+            status,
+            fields.get("overwrite"),
+        ))
     with conn.cursor() as cur:
-        cur.execute(sql, params)
+        psycopg2.extras.execute_values(
+            cur, UPDATE_MANY_KEEP_CLAIMS_SQL if keep_claims else UPDATE_MANY_SQL, values,
+            template=UPDATE_MANY_TEMPLATE, page_size=len(values)
+        )
+        return cur.rowcount
+
+
+def new_writer(conn, keep_claims: bool = False, memo=None) -> Dict[str, Any]:
+    """
+    Result buffer for queue_result / flush_results (keep_claims: see
+    db_update_many). With an ExtractMemo `memo`, memoize() records extractor
+    results there, committed on every flush.
+    """
+    return {"conn": conn, "items": [], "since": time.monotonic(), "written": 0, "dropped": [],
+            "keep_claims": keep_claims, "memo": memo}
+
+
+def queue_result(writer: Dict[str, Any], notice_id: str, fields: Dict[str, Any], status: str):
+    """Buffer one notice's result; flushes on WRITE_BATCH items or WRITE_FLUSH_SECONDS."""
+    writer["items"].append((notice_id, fields, status))
+    if (len(writer["items"]) >= WRITE_BATCH
+            or time.monotonic() - writer["since"] >= WRITE_FLUSH_SECONDS):
+        flush_results(writer)
+
+
+def memoize(writer: Dict[str, Any], fields: Dict[str, Any]):
+    """Put a versioned_fields result into the writer's memo, so --backfill can reuse it."""
+    if writer["memo"] is None or not fields.get("text_sha256") or not fields.get("extractor_versions"):
+        return
+    try:
+        ExtractMemo.remember(writer["memo"], fields["text_sha256"], memo_entries(fields))
+    except sqlite3.Error as e:
+        logging.warning("Memoizing extractor results failed: %r", e)
+
+
+def release_ids(conn, ids: List[str], worker: str = WORKER_ID) -> int:
+    """Drop `worker`'s claims on these notices only."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE public.notices_stage SET claimed_by = NULL, claimed_until = NULL "
+            "WHERE claimed_by = %s AND notice_id = ANY(%s)",
+            (worker, ids),
+        )
+        return cur.rowcount
+
+
+def flush_results(writer: Dict[str, Any]) -> int:
+    """
+    Write everything buffered in one statement. On a DB error the items are
+    retried one by one; what still fails is dropped (logged, added to
+    writer["dropped"] as (notice_id, status)) and its claims are released, so
+    another batch picks it up.
+    """
+    items, writer["items"] = writer["items"], []
+    writer["since"] = time.monotonic()
+    if not items:
+        return 0
+    if writer["memo"] is not None:
+        try:
+            writer["memo"].commit()
+        except sqlite3.Error as e:
+            logging.warning("Committing the extractor memo failed: %r", e)
+    try:
+        n = db_update_many(writer["conn"], items, writer["keep_claims"])
+    except Exception as e:
+        logging.exception("Writing %d results failed, retrying one by one: %r", len(items), e)
+        n, dropped = 0, []
+        for item in items:
+            try:
+                n += db_update_many(writer["conn"], [item], writer["keep_claims"])
+            except Exception as e:
+                logging.error("Writing the result of %s failed; dropped: %r", item[0], e)
+                dropped.append(item[0])
+                writer["dropped"].append((item[0], item[2]))
+        if dropped and not writer["keep_claims"]:
+            try:
+                release_ids(writer["conn"], dropped)
+            except Exception as e:
+                logging.warning("Releasing %d claims failed: %r", len(dropped), e)
+    writer["written"] += n
+    return n
 
 
 # -------------------------
@@ -105,16 +455,140 @@ SESSION.headers.update(
         "Accept-Language": "lt,lt-LT;q=0.9,en;q=0.8",
     }
 )
+# one connection pool per host, big enough for every download worker
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(10, DOWNLOAD_WORKERS))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
 PDF_EXT_RE = re.compile(r"\.pdf($|\?)", re.IGNORECASE)
 
+_HOST_SLOTS: Dict[str, threading.BoundedSemaphore] = {}
+_HOST_SLOTS_LOCK = threading.Lock()
+
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    host = RateLimit.host_of(url)
+    with _HOST_SLOTS_LOCK:
+        if host not in _HOST_SLOTS:
+            _HOST_SLOTS[host] = threading.BoundedSemaphore(PER_HOST_CONNECTIONS)
+        return _HOST_SLOTS[host]
 
-def get_url(url: str) -> requests.Response:
+
+def get_url(url: str, extra_headers: Optional[Dict[str, str]] = None) -> requests.Response:
     headers = {"Referer": url.split("/epps/")[0] if "/epps/" in url else url}
-    resp = SESSION.get(url, timeout=REQ_TIMEOUT, allow_redirects=True, headers=headers)
+    headers.update(extra_headers or {})
+    # per-host adaptive pacing, see RateLimit.py
+    RateLimit.wait(url)
+    t0 = time.monotonic()
+    try:
+        resp = SESSION.get(url, timeout=REQ_TIMEOUT, allow_redirects=True, headers=headers, stream=True)
+    except requests.RequestException:
+        RateLimit.report(url, time.monotonic() - t0, error=True)
+        raise
+    RateLimit.report(url, time.monotonic() - t0, status=resp.status_code,
+                     retry_after=RateLimit.retry_after_seconds(resp.headers))
+    if not resp.ok:
+        resp.close()
     resp.raise_for_status()
     return resp
 
 
+def read_pdf_body(resp: requests.Response, first: bytes, chunks) -> Optional[Dict[str, Any]]:
+    """
+    Rest of a streamed PDF response. Returns {"pdf": bytes or file path, "sha256"}:
+    bytes up to PARSE_SPILL_BYTES, else the file it was streamed to;
+    {"too_large": True} if it is larger than PDF_MAX_BYTES.
+    """
+    cache = pdf_cache()
+    declared = int(resp.headers.get("Content-Length") or 0)
+    if declared > PDF_MAX_BYTES:
+        logging.warning("PDF too large (%d bytes > PDF_MAX_BYTES): %s", declared, resp.url)
+        return {"too_large": True}
+
+    h = hashlib.sha256()
+    buf = bytearray()
+    f, path, size = None, None, 0
+    try:
+        for chunk in _chain(first, chunks):
+            size += len(chunk)
+            if size > PDF_MAX_BYTES:
+                logging.warning("PDF too large (> %d bytes): %s", PDF_MAX_BYTES, resp.url)
+                if f is not None:
+                    f.close()
+                    os.unlink(path)
+                    f = None
+                return {"too_large": True}
+            h.update(chunk)
+            if f is None and size > PARSE_SPILL_BYTES:
+                spill_dir = PdfCache.spill_dir(cache) if cache is not None else None
+                fd, path = tempfile.mkstemp(prefix=SPILL_PREFIX, suffix=".pdf", dir=spill_dir)
+                f = os.fdopen(fd, "wb")
+                f.write(buf)
+                buf = bytearray()
+            if f is not None:
+                f.write(chunk)
+            else:
+                buf += chunk
+    except Exception:
+        if f is not None:
+            f.close()
+            os.unlink(path)
+        raise
+    if f is not None:
+        f.close()
+
+    sha = h.hexdigest()
+    if cache is None:
+        return {"pdf": path if path else bytes(buf), "sha256": sha}
+    if path:
+        return {"pdf": PdfCache.adopt_file(cache, path, sha), "sha256": sha}
+    data = bytes(buf)
+    PdfCache.put_blob(cache, data, sha)
+    return {"pdf": data, "sha256": sha}
+
+
+def _chain(first: bytes, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def fetch(url: str, extra_headers: Optional[Dict[str, str]] = None, read_pdf: bool = True):
+    """
+    Streamed GET, holding the host's connection slot until the body is read.
+    Returns (response, body): body is {"pdf", "sha256"} or {"too_large"} (see
+    read_pdf_body) when the response looks like a PDF (%PDF- in the first chunk, content type
+    or filename), {"html": text} for an HTML page, else None (also for 304).
+    With read_pdf=False a PDF is only recognized: {"pdf": None, "sha256": None}.
+    """
+    with host_slot(url):
+        r = get_url(url, extra_headers)
+        try:
+            if r.status_code == 304:
+                return r, None
+            chunks = r.iter_content(CHUNK_BYTES)
+            first = next(chunks, b"")
+            if looks_like_pdf(r, first[:8]):
+                if not read_pdf:
+                    return r, {"pdf": None, "sha256": None}
+                return r, read_pdf_body(r, first, chunks)
+            if "html" in (r.headers.get("Content-Type") or "").lower():
+                buf = bytearray(first)
+                for chunk in chunks:
+                    buf += chunk
+                    if len(buf) > HTML_MAX_BYTES:
+                        break
+                return r, {"html": bytes(buf[:HTML_MAX_BYTES]).decode(r.encoding or "utf-8", errors="replace")}
+            return r, None
+        finally:
+            r.close()
+
+
+def discard(src):
+    """Remove a temp spill file handed out by read_pdf_body (cache blobs stay)."""
+    if isinstance(src, str) and os.path.basename(src).startswith(SPILL_PREFIX):
+        os.unlink(src)
+
+
 def looks_like_pdf(resp: requests.Response, head: bytes) -> bool:
     ctype = (resp.headers.get("Content-Type") or "").lower()
     cdisp = resp.headers.get("Content-Disposition") or ""
@@ -129,44 +603,224 @@ def looks_like_pdf(resp: requests.Response, head: bytes) -> bool:
     )
 
 
-def fetch_pdf_bytes(url: str) -> Tuple[Optional[bytes], Optional[str]]:
+# content-addressed PDF store + per-URL validators (None if PDF_CACHE_DIR=""),
+# opened on first use: importing this module for its extractors creates nothing
+_CACHE: Dict[str, Any] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def pdf_cache() -> Optional[Dict[str, Any]]:
+    """The shared PdfCache handle (download threads included), opened on the first call."""
+    with _CACHE_LOCK:
+        if "cache" not in _CACHE:
+            _CACHE["cache"] = PdfCache.open_cache()
+        return _CACHE["cache"]
+
+
+def pdf_links(html: str, base_url: str) -> List[str]:
+    """Absolute URLs of the .pdf links on a page, in page order."""
+    hrefs = re.findall(r'href=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
+    return [urljoin(base_url, h) for h in hrefs if PDF_EXT_RE.search(h)]
+
+
+def is_transient(e: Exception) -> bool:
+    """Network trouble, a 5xx or a 429, as opposed to a URL that is just not there (other 4xx)."""
+    resp = getattr(e, "response", None)
+    return resp is None or resp.status_code >= 500 or resp.status_code == 429
+
+
+class PdfTooLarge(Exception):
+    """The PDF is there but over PDF_MAX_BYTES, so it was not downloaded."""
+
+
+def fetch_linked_pdf(pdf_url: str) -> Tuple[Optional[Any], Optional[str], Optional[str]]:
+    """
+    (PDF, final URL, sha256) for a PDF link, conditional on what PdfCache has
+    for it (a 304 reuses the stored PDF); Nones if it does not serve a PDF.
+    Network errors and PdfTooLarge are raised.
+    """
+    cache = pdf_cache()
+    meta = PdfCache.lookup(cache, pdf_url)
+    r, body = fetch(pdf_url, PdfCache.conditional_headers(meta))
+    if r.status_code == 304 and meta:
+        return PdfCache.read(cache, meta["sha256"], PARSE_SPILL_BYTES), meta["final_url"], meta["sha256"]
+    if body and body.get("too_large"):
+        raise PdfTooLarge(pdf_url)
+    if body and "pdf" in body:
+        PdfCache.remember(cache, pdf_url, r.headers, body["sha256"], r.url)
+        return body["pdf"], r.url, body["sha256"]
+    return None, None, None
+
+
+def fetch_pdf_bytes(url: str) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    PDF and final URL for a notice URL (the PDF itself or a page linking to
+    it). The PDF comes back as bytes, or as a file path when larger than
+    PARSE_SPILL_BYTES (release it with discard()). Requests are conditional on
+    what PdfCache has seen for the URL; a 304 reuses the stored PDF.
+
+    A page whose PDF link was resolved before (PdfCache resolutions, see
+    --resolve) is not requested: its link is, and the page only again if the
+    link stops serving a PDF. A page known to have no PDF is not requested;
+    a page is only remembered as such when none of its PDF links failed.
+    Raises PdfTooLarge when the PDF is over PDF_MAX_BYTES.
+    """
+    cache = pdf_cache()
+    res = PdfCache.resolution(cache, url)
+    if res and res["pdf_url"] is None:
+        logging.warning("No PDF behind %s (as of %s)", url, res["resolved_at"])
+        return None, None
+    if res and res["pdf_url"] != url:
+        try:
+            data, final_url, _ = fetch_linked_pdf(res["pdf_url"])
+            if data is not None:
+                return data, final_url
+        except PdfTooLarge:
+            raise
+        except Exception as e:
+            logging.warning("Resolved .pdf GET failed: %s (%r)", res["pdf_url"], e)
+            return None, None
+        PdfCache.forget_resolution(cache, url)
+
+    meta = PdfCache.lookup(cache, url)
     try:
-        r = get_url(url)
+        r, body = fetch(url, PdfCache.conditional_headers(meta))
     except Exception as e:
         logging.warning("Initial GET failed: %s (%r)", url, e)
         return None, None
 
-    head = r.content[:8] if r.content else b""
-    if looks_like_pdf(r, head):
-        return r.content, r.url
-
-    ctype = (r.headers.get("Content-Type") or "").lower()
-    if "html" in ctype:
-        html = r.text or ""
-        hrefs = re.findall(r'href=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
-        for h in hrefs:
-            if PDF_EXT_RE.search(h):
-                pdf_url = urljoin(r.url, h)
-                try:
-                    r2 = get_url(pdf_url)
-                except Exception as e:
-                    logging.warning("Follow-up .pdf GET failed: %s (%r)", pdf_url, e)
-                    continue
-                head2 = r2.content[:8] if r2.content else b""
-                if looks_like_pdf(r2, head2):
-                    return r2.content, r2.url
+    if r.status_code == 304 and meta:
+        if meta["final_url"] and meta["final_url"] != url:
+            PdfCache.remember_resolution(cache, url, meta["final_url"])
+        return PdfCache.read(cache, meta["sha256"], PARSE_SPILL_BYTES), meta["final_url"]
+
+    if body and body.get("too_large"):
+        raise PdfTooLarge(url)
+    if body and "pdf" in body:
+        PdfCache.remember(cache, url, r.headers, body["sha256"], r.url)
+        return body["pdf"], r.url
+
+    if body and "html" in body:
+        # a link that failed or was too large may be the PDF: not "no PDF"
+        failed, too_large = False, False
+        for pdf_url in pdf_links(body["html"], r.url):
+            try:
+                data, final_url, sha = fetch_linked_pdf(pdf_url)
+            except PdfTooLarge:
+                too_large = True
+                continue
+            except Exception as e:
+                logging.warning("Follow-up .pdf GET failed: %s (%r)", pdf_url, e)
+                failed = True
+                continue
+            if data is not None:
+                PdfCache.remember(cache, url, r.headers, sha, final_url)
+                PdfCache.remember_resolution(cache, url, pdf_url)
+                return data, final_url
+        if too_large:
+            raise PdfTooLarge(url)
+        if not failed:
+            PdfCache.remember_resolution(cache, url, None)
     return None, None
 
 
+def resolve_url(url: str) -> str:
+    """
+    Find and remember the PDF behind a notice URL without downloading it
+    (only the first chunk of each candidate is read). Returns "direct" (the
+    URL is the PDF), "linked", "none" (remembered as negative) or "error".
+    """
+    cache = pdf_cache()
+    try:
+        r, body = fetch(url, read_pdf=False)
+    except Exception as e:
+        logging.warning("Resolve GET failed: %s (%r)", url, e)
+        if is_transient(e):
+            return "error"
+        PdfCache.remember_resolution(cache, url, None)
+        return "none"
+    if body and "pdf" in body:
+        PdfCache.remember_resolution(cache, url, url)
+        return "direct"
+    if not body or "html" not in body:
+        PdfCache.remember_resolution(cache, url, None)
+        return "none"
+    outcome = "none"
+    for pdf_url in pdf_links(body["html"], r.url):
+        try:
+            _, body2 = fetch(pdf_url, read_pdf=False)
+        except Exception as e:
+            logging.warning("Resolve .pdf GET failed: %s (%r)", pdf_url, e)
+            # a broken link may still be the PDF (see fetch_pdf_bytes)
+            outcome = "error"
+            continue
+        if body2 and "pdf" in body2:
+            PdfCache.remember_resolution(cache, url, pdf_url)
+            return "linked"
+    if outcome == "none":
+        PdfCache.remember_resolution(cache, url, None)
+    return outcome
+
+
+# URLs of the notices still waiting for extraction (see CLAIM_SQL)
+RESOLVE_SELECT_SQL = """
+SELECT DISTINCT pdf_urls
+FROM public.notices_stage
+WHERE pdf_urls IS NOT NULL
+  AND (extraction_status IS NULL OR extraction_status NOT IN ('ok', 'dead_letter'))
+"""
+
+
+def warm_resolutions(ids: Optional[List[str]] = None, limit: int = 0):
+    """
+    Resolve the notice URLs (those waiting for extraction, or of `ids`) that
+    PdfCache has no resolution for, on DOWNLOAD_WORKERS threads.
+    """
+    cache = pdf_cache()
+    if cache is None:
+        logging.error("PDF_CACHE_DIR is empty: there is nowhere to keep resolutions.")
+        return
+    conn = db_connect()
+    with conn.cursor() as cur:
+        if ids:
+            cur.execute("SELECT DISTINCT pdf_urls FROM public.notices_stage "
+                        "WHERE pdf_urls IS NOT NULL AND notice_id = ANY(%s)", (ids,))
+        else:
+            cur.execute(RESOLVE_SELECT_SQL)
+        urls = [u for (u,) in cur.fetchall() if PdfCache.resolution(cache, u) is None]
+    conn.close()
+    if limit > 0:
+        urls = urls[:limit]
+    logging.info("Resolving %d URLs on %d threads.", len(urls), DOWNLOAD_WORKERS)
+
+    t0 = time.monotonic()
+    counts = {"direct": 0, "linked": 0, "none": 0, "error": 0}
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        for i, outcome in enumerate(pool.map(resolve_url, urls), 1):
+            counts[outcome] += 1
+            if i % 100 == 0:
+                logging.info("Resolved %d/%d (%.0f URLs/s).", i, len(urls), i / (time.monotonic() - t0))
+    logging.info(
+        "Resolve done in %.1fs: direct PDF=%d, linked PDF=%d, no PDF=%d, errors=%d.",
+        time.monotonic() - t0, counts["direct"], counts["linked"], counts["none"], counts["error"],
+    )
+
+
 # -------------------------
 # TEXT EXTRACTION
 # -------------------------
-def extract_text_pymupdf(data: bytes) -> Optional[str]:
+# `data` is the PDF bytes or a path to the PDF on disk
+def _as_file(data):
+    return data if isinstance(data, str) else io.BytesIO(data)
+
+
+def extract_text_pymupdf(data) -> Optional[str]:
     try:
         import fitz
 
         out = []
-        with fitz.open(stream=data, filetype="pdf") as doc:
+        doc = fitz.open(data) if isinstance(data, str) else fitz.open(stream=data, filetype="pdf")
+        with doc:
             for page in doc:
                 out.append(page.get_text("text") or "")  # type:ignore
         return "\n".join(out).strip()
@@ -174,12 +828,12 @@ def extract_text_pymupdf(data: bytes) -> Optional[str]:
         return None
 
 
-def extract_text_pdfplumber(data: bytes) -> Optional[str]:
+def extract_text_pdfplumber(data) -> Optional[str]:
     try:
         import pdfplumber
 
         out = []
-        with pdfplumber.open(io.BytesIO(data)) as pdf:
+        with pdfplumber.open(_as_file(data)) as pdf:
             for page in pdf.pages:
                 out.append(page.extract_text() or "")
         return "\n".join(out).strip()
@@ -187,11 +841,11 @@ def extract_text_pdfplumber(data: bytes) -> Optional[str]:
         return None
 
 
-def extract_text_pypdf2(data: bytes) -> Optional[str]:
+def extract_text_pypdf2(data) -> Optional[str]:
     try:
         from PyPDF2 import PdfReader
 
-        reader = PdfReader(io.BytesIO(data))
+        reader = PdfReader(_as_file(data))
         out = []
         for p in reader.pages:
             out.append(p.extract_text() or "")
@@ -200,7 +854,7 @@ def extract_text_pypdf2(data: bytes) -> Optional[str]:
         return None
 
 
-def extract_text_from_pdf(data: bytes) -> Tuple[str, str]:
+def extract_text_from_pdf(data) -> Tuple[str, str]:
     for fn, name in [
         (extract_text_pymupdf, "PyMuPDF"),
         (extract_text_pdfplumber, "pdfplumber"),
@@ -293,21 +947,88 @@ def parse_date_lt(s: str) -> Optional[str]:
     return None
 
 
-def find_section(text: str, start_pat: str, end_pat: str) -> str:
-    ms = re.search(start_pat, text, re.IGNORECASE | re.DOTALL | re.MULTILINE)
-    if not ms:
-        return ""
-    me = re.search(end_pat, text[ms.end() :], re.IGNORECASE | re.DOTALL | re.MULTILINE)
-    return text[ms.start() : ms.end() + me.start()] if me else text[ms.start() :]
+# -------------------------
+# SECTION INDEX
+# -------------------------
+# Numbered heading at the start of a line followed by a capitalised title:
+# "5 Pirkimo dalis", "5.1.10 Skyrimo kriterijai", "5. 1. 7 Strateginis ..."
+HEADING_RE = re.compile(
+    r"^(\d{1,2}(?:\.[ ]?\d{1,2}){0,3})[ \t]+(?=[A-ZĄČĘĖĮŠŲŪŽ])([^\n]*)", re.MULTILINE
+)
+
+
+def build_section_index(text: str) -> Dict[str, Any]:
+    """
+    One pass over the text collecting every numbered heading, in document
+    order, as {"num": (5, 1, 10), "title", "start" (line start), "title_start"}.
+    Kept flat rather than nested: eForms repeats 5.1 / 6.1 per lot and stray
+    numbered lines ("78 KATEGORIJA ...") occur, so each query states where
+    its section stops (see section_span).
+    """
+    heads = []
+    for m in HEADING_RE.finditer(text):
+        heads.append({
+            "num": tuple(int(x) for x in re.split(r"\.[ ]?", m.group(1))),
+            "title": m.group(2),
+            "start": m.start(),
+            "title_start": m.start(2),
+        })
+    return {"text": text, "heads": heads, "starts": [h["start"] for h in heads]}
+
+
+def find_heading(index: Dict[str, Any], num: Tuple[int, ...], title_pat: str,
+                 lo: int = 0, hi: Optional[int] = None):
+    """First heading `num` whose title starts with `title_pat` in [lo, hi): (position, title match) or None."""
+    heads = index["heads"]
+    i = bisect.bisect_left(index["starts"], lo)
+    while i < len(heads) and (hi is None or heads[i]["start"] < hi):
+        if heads[i]["num"] == num:
+            tm = re.match(title_pat, heads[i]["title"], re.IGNORECASE)
+            if tm:
+                return i, tm
+        i += 1
+    return None
+
+
+def section_span(index: Dict[str, Any], i: int, tm, stop, hi: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (body start, end) of heading i: from right after the matched title up to
+    the newline before the first later heading with stop(num, title) true,
+    else up to `hi` (end of text).
+    """
+    heads = index["heads"]
+    hi = len(index["text"]) if hi is None else hi
+    body = heads[i]["title_start"] + tm.end()
+    for j in range(i + 1, len(heads)):
+        h = heads[j]
+        if h["start"] >= hi:
+            break
+        if stop(h["num"], h["title"]):
+            return body, h["start"] - 1
+    return body, hi
+
+
+def subsection_text(index: Dict[str, Any], num: Tuple[int, ...], title_pat: str, stop,
+                    lo: int = 0, hi: Optional[int] = None) -> Optional[str]:
+    """Body of heading `num` / `title_pat` inside [lo, hi), or None if it is not there."""
+    found = find_heading(index, num, title_pat, lo, hi)
+    if not found:
+        return None
+    b, e = section_span(index, found[0], found[1], stop, hi)
+    return index["text"][b:e]
 
 
 # -------------------------
 # BASIC FIELD EXTRACTORS
 # -------------------------
-def extract_buyer(text: str) -> Optional[str]:
-    sec1 = find_section(text, r"\n1\s+Pirkėjas", r"(?:\n2\s+Procedūra|\Z)")
-    if not sec1:
+def extract_buyer(text: str, index: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    index = index or build_section_index(text)
+    found = find_heading(index, (1,), r"Pirkėjas")
+    if not found:
         return None
+    b, e = section_span(index, found[0], found[1],
+                        lambda num, title: num == (2,) and title.startswith("Procedūra"))
+    sec1 = text[b:e]
     m = re.search(r"Oficialus pavadinimas:\s*(.+)", sec1, re.IGNORECASE)
     return norm_one_line(m.group(1)) if m else None
 
@@ -435,26 +1156,19 @@ def _extract_weight_from_block(txt: str) -> int | None:
     return None
 
 
-def parse_criteria_section(lot_block: str) -> tuple[list[dict], dict]:
+def parse_criteria_section(crit_text: Optional[str]) -> tuple[list[dict], dict]:
     """
-    Robust parser for '5.1.10 Skyrimo kriterijai'.
+    Robust parser for the body of '5.1.10 Skyrimo kriterijai' (None if the
+    lot has no such section).
     Returns:
       - criteria_list: list of objects with fields (Rūšis, Pavadinimas, Aprašymas,
         Kategorija_eilutė, Svoris, Metodas_aprašymas, Pagrindimas) when present.
       - summary_dict: {"Kaina_%": int, "Kokybė_%": int} if types are mapped.
     """
-    # 1) Isolate the criteria section of this LOT
-    sec = re.search(
-        r"5\.1\.10\s+Skyrimo\s+kriterijai(.*?)(?=\n5\.1\.(?:11|12|13|14|15|16|\d)|\n5\.2|\n6\b|\Z)",
-        lot_block,
-        re.IGNORECASE | re.DOTALL,
-    )
-    if not sec:
+    if crit_text is None:
         return [], {}
 
-    crit_text = sec.group(1)
-
-    # 2) Split into 'Kriterijus:' blocks (allow blank lines after the label)
+    # Split into 'Kriterijus:' blocks (allow blank lines after the label)
     parts = re.split(r"\bKriterijus\s*:\s*(?:\n+)?", crit_text, flags=re.IGNORECASE)
     parts = [p for p in parts if p.strip()]
     if not parts:
@@ -500,22 +1214,17 @@ def parse_criteria_section(lot_block: str) -> tuple[list[dict], dict]:
     return criteria, summary
 
 
-def parse_bendra_informacija(lot_block: str) -> dict:
+def parse_bendra_informacija(sec_text: Optional[str], lot_block: str) -> dict:
     """
-    Parse '5.1.6 Bendra informacija' for a lot block.
-    Returns booleans and the first meaningful line, even if the 5.1.6 header is missing.
+    Parse the body of '5.1.6 Bendra informacija' for a lot block.
+    Returns booleans and the first meaningful line, even if the 5.1.6 header
+    is missing (sec_text None: the whole lot block is searched).
     """
-    # Try to isolate the section first
-    sec_m = re.search(
-        r"5\.1\.6\s+Bendra\s+informacija(.*?)(?=\n5\.1\.(?:7|8|9|10|11|12|13|14|15|16)|\n5\.2|\n6\b|\Z)",
-        lot_block,
-        re.IGNORECASE | re.DOTALL,
-    )
-    t = sec_m.group(1) if sec_m else lot_block  # fallback: search the whole lot block
+    t = sec_text if sec_text is not None else lot_block
 
     # First meaningful line inside the section (if we found it)
     first_line = None
-    if sec_m:
+    if sec_text is not None:
         for ln in t.splitlines():
             ln = ln.strip()
             if ln:
@@ -543,7 +1252,7 @@ def parse_bendra_informacija(lot_block: str) -> dict:
         "ES_fondai": es_funds,
         "SVP_taikoma": svp,
         "pirma_eilute": first_line,
-        "section_found": bool(sec_m),
+        "section_found": sec_text is not None,
     }
 
 
@@ -578,17 +1287,12 @@ def _merge_orphan_winner_items(items: list[dict]) -> list[dict]:
     return merged
 
 
-def parse_strateginis_vp(lot_block: str) -> dict:
+def parse_strateginis_vp(t: Optional[str]) -> dict:
     """
-    Parse 5.1.7 Strateginis viešasis pirkimas.
+    Parse the body of 5.1.7 Strateginis viešasis pirkimas (None if absent).
     Returns dict with keys: tikslas, aprasymas, metodas, zvp_kriterijai (any may be None).
     """
-    sec = re.search(
-        r"5\.\s*1\.\s*7\s+Strateginis\s+viešasis\s+pirkimas(.*?)(?=\n5\.\s*1\.\s*(?:8|9|10|11|12|13|14|15|16|\d)|\n5\.\s*2|\n6\b|\Z)",
-        lot_block,
-        re.IGNORECASE | re.DOTALL,
-    )
-    if not sec:
+    if t is None:
         return {
             "tikslas": None,
             "aprasymas": None,
@@ -596,8 +1300,6 @@ def parse_strateginis_vp(lot_block: str) -> dict:
             "zvp_kriterijai": None,
         }
 
-    t = sec.group(1)
-
     def grab_line(pat: str):
         m = re.search(pat, t, re.IGNORECASE)
         return m.group(1).strip() if m else None
@@ -831,18 +1533,37 @@ def parse_winner_block(wb: str) -> dict:
 LOT_HEADER = re.compile(r"\bLOT[-\s]?0*(\d+)\b", re.IGNORECASE)
 
 
-def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
+def _lot_stop_516(num, title) -> bool:
+    # end of 5.1.6: 5.1.7 .. 5.1.16, 5.2 or section 6
+    return (num[:2] == (5, 1) and len(num) > 2 and 7 <= num[2] <= 16) or num[:2] == (5, 2) or num[0] == 6
+
+def _lot_stop_51x(num, title) -> bool:
+    # end of 5.1.7 / 5.1.10: the next 5.1.x, 5.2 or section 6
+    return (num[:2] == (5, 1) and len(num) > 2) or num[:2] == (5, 2) or num[0] == 6
+
+def extract_lots(text: str, index: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Dict[str, Any]]]:
     """
     Two-pass LOT parser:
       - Pass 1 over Section 5 ('Pirkimo dalis'): title/description/cpv/NUTS/Šalis/criteria/etc.
       - Pass 2 over Section 6 ('Rezultatai'): winners, non-award messages, stats.
+    Lot blocks and their subsections are sliced via the section index, so the
+    work is linear in the text length however many lots there are.
     Returns a dict keyed by 'LOT-####'.
     """
+    index = index or build_section_index(text)
+
     # Section slicing (robust ends)
-    sec5 = find_section(text, r"\n5\s+Pirkimo\s+dalis", r"(?:\n6\s+Rezultatai)")
-    sec6 = find_section(
-        text, r"\n6\s+Rezultatai", r"(?:\n7\s+|\n8\s+|Skelbimo\s+informacija|\Z)"
-    )
+    sec5_span = sec6_span = None
+    found = find_heading(index, (5,), r"Pirkimo\s+dalis")
+    if found:
+        sec5_span = (index["heads"][found[0]]["start"],
+                     section_span(index, found[0], found[1],
+                                  lambda num, title: num == (6,) and title.startswith("Rezultatai"))[1])
+    found = find_heading(index, (6,), r"Rezultatai")
+    if found:
+        b, e = section_span(index, found[0], found[1], lambda num, title: num in ((7,), (8,)))
+        mi = re.compile(r"Skelbimo\s+informacija", re.IGNORECASE).search(text, b, e)
+        sec6_span = (index["heads"][found[0]]["start"], mi.start() if mi else e)
 
     lots_map: Dict[str, Dict[str, Any]] = {}
 
@@ -874,22 +1595,29 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
     # =========================
     # PASS 1: Section 5 (meta)
     # =========================
-    if sec5:
-        for m in re.finditer(
-            r"5\.1\s+Techninės\s+ID\s+dalies:\s*(LOT[-\s]?0*\d+)", sec5, re.IGNORECASE
-        ):
-            lot_token = m.group(1)
-            lot_num_m = LOT_HEADER.search(lot_token)
+    if sec5_span:
+        lot_heads = []
+        lo, hi = sec5_span
+        while True:
+            found = find_heading(index, (5, 1), r"Techninės\s+ID\s+dalies:\s*LOT", lo, hi)
+            if not found:
+                break
+            lot_heads.append(found)
+            lo = index["heads"][found[0]]["start"] + 1
+
+        for k, (i, tm) in enumerate(lot_heads):
+            m = re.match(r"Techninės\s+ID\s+dalies:\s*(LOT[-\s]?0*\d+)",
+                         index["heads"][i]["title"], re.IGNORECASE)
+            if not m:
+                continue
+            lot_num_m = LOT_HEADER.search(m.group(1))
             if not lot_num_m:
                 continue
             lot_id = f"LOT-{int(lot_num_m.group(1)):04d}"
 
-            start = m.end()
-            nm = re.search(
-                r"\n5\.1\s+Techninės\s+ID\s+dalies:\s*LOT", sec5[start:], re.IGNORECASE
-            )
-            end = start + nm.start() if nm else len(sec5)
-            block = sec5[start:end]
+            start = index["heads"][i]["title_start"] + m.end()
+            end = index["heads"][lot_heads[k + 1][0]]["start"] - 1 if k + 1 < len(lot_heads) else hi
+            block = text[start:end]
 
             lot = lots_map.setdefault(lot_id, blank_lot())
 
@@ -941,7 +1669,10 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
                 except Exception:
                     pass
 
-            bendra = parse_bendra_informacija(block)
+            bendra = parse_bendra_informacija(
+                subsection_text(index, (5, 1, 6), r"Bendra\s+informacija", _lot_stop_516, start, end),
+                block,
+            )
             lot["Bendra informacija"] = bendra
             if bendra["ES_fondai"] is not None:
                 lot["ES_fondai"] = bendra["ES_fondai"]
@@ -949,7 +1680,10 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
                 lot["SVP_taikoma"] = bendra["SVP_taikoma"]
 
             # Strategy / GPP criteria (keep short; they can be verbose)
-            svp = parse_strateginis_vp(block)
+            svp = parse_strateginis_vp(
+                subsection_text(index, (5, 1, 7), r"Strateginis\s+viešasis\s+pirkimas",
+                                _lot_stop_51x, start, end)
+            )
             if svp["tikslas"] is not None:
                 lot["Strateginis tikslas"] = svp["tikslas"]
             if svp["aprasymas"] is not None:
@@ -960,7 +1694,9 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
                 lot["ŽVP: kriterijai"] = svp["zvp_kriterijai"]
 
             # Criteria numeric weights
-            crit_list, crit_summary = parse_criteria_section(block)
+            crit_list, crit_summary = parse_criteria_section(
+                subsection_text(index, (5, 1, 10), r"Skyrimo\s+kriterijai", _lot_stop_51x, start, end)
+            )
             if crit_list or crit_summary:
                 lot["Skyrimo kriterijai"] = {
                     "santrauka": crit_summary or {},
@@ -970,10 +1706,13 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
     # =========================
     # PASS 2: Section 6 (results)
     # =========================
-    if sec6:
-        for m in re.finditer(
-            r"pirkimo\s+dalies\s+ID:\s*(LOT[-\s]?0*\d+)", sec6, re.IGNORECASE
-        ):
+    if sec6_span:
+        # not every result block sits under a "6.1" heading line, so these are
+        # found by text; each block ends at the next "pirkimo dalies ID: LOT"
+        lo, hi = sec6_span
+        bounds = [b.start() for b in
+                  re.compile(r"pirkimo\s+dalies\s+ID:\s*LOT", re.IGNORECASE).finditer(text, lo, hi)]
+        for m in re.compile(r"pirkimo\s+dalies\s+ID:\s*(LOT[-\s]?0*\d+)", re.IGNORECASE).finditer(text, lo, hi):
             lot_token = m.group(1)
             lot_num_m = LOT_HEADER.search(lot_token)
             if not lot_num_m:
@@ -981,9 +1720,9 @@ def extract_lots(text: str) -> Optional[Dict[str, Dict[str, Any]]]:
             lot_id = f"LOT-{int(lot_num_m.group(1)):04d}"
 
             start = m.end()
-            nm = re.search(r"pirkimo\s+dalies\s+ID:\s*LOT", sec6[start:], re.IGNORECASE)
-            end = start + nm.start() if nm else len(sec6)
-            block = sec6[start:end]
+            k = bisect.bisect_left(bounds, start)
+            end = bounds[k] if k < len(bounds) else hi
+            block = text[start:end]
 
             lot = lots_map.setdefault(lot_id, blank_lot())
 
@@ -1081,97 +1820,766 @@ def preview(text: str, n: int = 500) -> str:
     return snippet + ("..." if len(text) > n else "")
 
 
-def main():
-    conn = db_connect()
-    rows = get_work(conn, BATCH_LIMIT)
-    if not rows:
-        logging.info("No rows need extraction based on current NULL filters.")
+# -------------------------
+# DOWNLOAD STAGE
+# -------------------------
+def download_stage(rows: List[dict], out_q: "queue.Queue"):
+    """
+    Fetch the PDF of every row on DOWNLOAD_WORKERS threads and put
+    (row, data, final_url, failure) on `out_q` as each finishes (failure: the
+    status to store when there is no data); None when all are done.
+    A full queue blocks the workers, so at most DOWNLOAD_WORKERS +
+    DOWNLOAD_QUEUE_SIZE PDFs are held in memory.
+    """
+    def work(row):
+        failure = "download_failed"
+        try:
+            data, final_url = fetch_pdf_bytes(row["pdf_urls"])
+        except PdfTooLarge as e:
+            logging.warning("PDF over PDF_MAX_BYTES for %s: %s", row["notice_id"], e)
+            data, final_url, failure = None, None, "too_large"
+        except Exception as e:
+            logging.warning("Download failed for %s: %r", row["notice_id"], e)
+            data, final_url = None, None
+        out_q.put((row, data, final_url, failure))
+
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            list(pool.map(work, rows))
+    finally:
+        out_q.put(None)
+
+
+# -------------------------
+# PARSE STAGE
+# -------------------------
+# Each extractor fills its own DB fields (NULL-on-unknown policy). Bump its
+# version whenever a change can alter its output: `--backfill` re-runs exactly
+# the extractors whose stored version differs.
+EXTRACTOR_VERSIONS = {
+    "procedure": 1,            # pirkimo_budas, procedura_pagreitinta
+    "aprasymas": 1,
+    "lots": 1,
+    "viso_sutarciu_verte": 1,
+}
+
+
+def _fields_procedure(notice_id: str, text: str, index) -> Dict[str, Any]:
+    budas, pagreitinta = None, None
+    try:
+        budas, pagreitinta = extract_procedure(text)
+    except Exception:
+        # Never fail the whole notice on a single extractor
+        pass
+    return {"pirkimo_budas": budas if budas else None, "procedura_pagreitinta": pagreitinta}
+
+
+def _fields_aprasymas(notice_id: str, text: str, index) -> Dict[str, Any]:
+    desc = None
+    try:
+        desc = extract_aprasymas(text)
+    except Exception:
+        pass
+    return {"aprasymas": desc if desc else None}
+
+
+def _fields_lots(notice_id: str, text: str, index) -> Dict[str, Any]:
+    lots = None
+    try:
+        lots = extract_lots(text, index)
+    except Exception as e:
+        logging.warning("extract_lots failed for %s: %r", notice_id, e)
+    return {"lots": lots if lots else None}
+
+
+def _fields_viso_sutarciu_verte(notice_id: str, text: str, index) -> Dict[str, Any]:
+    verte = extract_viso_sutarciu_verte(text)
+    return {"viso_sutarciu_verte": verte if verte else None}
+
+
+EXTRACTORS = {
+    "procedure": _fields_procedure,
+    "aprasymas": _fields_aprasymas,
+    "lots": _fields_lots,
+    "viso_sutarciu_verte": _fields_viso_sutarciu_verte,
+}
+# The notices_stage columns each extractor fills
+EXTRACTOR_COLUMNS = {
+    "procedure": ("pirkimo_budas", "procedura_pagreitinta"),
+    "aprasymas": ("aprasymas",),
+    "lots": ("lots",),
+    "viso_sutarciu_verte": ("viso_sutarciu_verte",),
+}
+EXTRACTED_COLUMNS = tuple(col for cols in EXTRACTOR_COLUMNS.values() for col in cols)
+
+
+class ExtractTimeout(BaseException):
+    """
+    A document ran past EXTRACT_BUDGET_SECONDS; `stage` is what was running.
+    A BaseException, so the extractors' `except Exception` cannot swallow it.
+    """
+    stage: Optional[str] = None
+
+
+def _budget_expired(signum, frame):
+    raise ExtractTimeout()
+
+
+@contextlib.contextmanager
+def time_budget(seconds: float = EXTRACT_BUDGET_SECONDS):
+    """
+    Raise ExtractTimeout inside the block once `seconds` have passed. Needs
+    the main thread of a process (the PARSE_WORKERS processes); elsewhere, or
+    with seconds <= 0, the block runs unlimited. Catch ExtractTimeout outside
+    the `with`: the alarm can land just as the block ends.
+    """
+    if (seconds <= 0 or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
         return
+    previous = signal.signal(signal.SIGALRM, _budget_expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-    logging.info("Found %d rows to try.", len(rows))
-    ok = fail = 0
 
-    for i, row in enumerate(rows, 1):
-        notice_id = row["notice_id"]
-        url = row["pdf_urls"]
-        logging.info("[%d/%d] notice_id=%s", i, len(rows), notice_id)
+def run_extractors(notice_id: str, text: str, names: Optional[List[str]] = None,
+                   timings: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    {extractor: its DB fields} for `names` (default: all extractors). Seconds
+    spent per extractor (and on the section index) go into `timings`; an
+    ExtractTimeout leaving here names the extractor it interrupted.
+    """
+    names = list(EXTRACTORS) if names is None else names
+    timings = {} if timings is None else timings
+    out = {}
+    stage, t0 = "section_index", time.perf_counter()
+    try:
+        index = build_section_index(text) if "lots" in names else None
+        timings[stage] = round(time.perf_counter() - t0, 4)
+        for stage in names:
+            t0 = time.perf_counter()
+            out[stage] = EXTRACTORS[stage](notice_id, text, index)
+            timings[stage] = round(time.perf_counter() - t0, 4)
+            if timings[stage] > EXTRACT_SLOW_SECONDS:
+                logging.warning("Slow extractor %s on %s: %.1fs", stage, notice_id, timings[stage])
+    except ExtractTimeout as e:
+        timings[stage] = round(time.perf_counter() - t0, 4)
+        e.stage = e.stage or stage
+        raise
+    return out
+
+
+def extract_fields(notice_id: str, text: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """All DB fields from normalized text (NULL-on-unknown policy)."""
+    fields: Dict[str, Any] = {}
+    for out in run_extractors(notice_id, text, timings=timings).values():
+        fields.update(out)
+    return fields
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def versioned_fields(notice_id: str, text: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """extract_fields plus the text hash, extractor versions and timings stored with them."""
+    timings = {} if timings is None else timings
+    fields = extract_fields(notice_id, text, timings)
+    fields["text_sha256"] = text_sha256(text)
+    fields["extractor_versions"] = dict(EXTRACTOR_VERSIONS)
+    fields["extraction_timings"] = timings
+    return fields
+
+
+def memo_entries(fields: Dict[str, Any]) -> Dict[str, Tuple[int, Dict[str, Any]]]:
+    """{extractor: (version, its fields)} of a versioned_fields result, for ExtractMemo.remember."""
+    return {
+        name: (version, {col: fields.get(col) for col in EXTRACTOR_COLUMNS[name]})
+        for name, version in fields["extractor_versions"].items()
+        if name in EXTRACTOR_COLUMNS
+    }
 
-        try:
-            data, final_url = fetch_pdf_bytes(url)
-            if not data:
-                db_update_partial(conn, notice_id, {}, "download_failed")
-                logging.warning("Could not download PDF for %s", notice_id)
-                fail += 1
-                continue
 
+def parse_pdf(notice_id: str, data) -> Dict[str, Any]:
+    """
+    Bytes (or path) of one PDF -> {"text", "method", "fields", "timings"};
+    "text" is "" when nothing could be extracted. Runs in a PARSE_WORKERS
+    process, so it only takes and returns plain picklable values.
+
+    Everything runs under EXTRACT_BUDGET_SECONDS: on overrun the result has
+    no fields and timings["timed_out"] names the stage (the text is kept if
+    it was already extracted).
+    """
+    timings: Dict[str, Any] = {}
+    text, method, fields = "", None, {}
+    stage, t0 = "pdf_text", time.perf_counter()
+    try:
+        with time_budget():
             text, method = extract_text_from_pdf(data)
-            if not text:
-                db_update_partial(conn, notice_id, {}, "empty_text")
-                logging.warning(
-                    "Empty text after extraction (method=%s) for %s", method, notice_id
-                )
-                fail += 1
+            timings[stage] = round(time.perf_counter() - t0, 4)
+            if text:
+                stage, t0 = "normalize", time.perf_counter()
+                text = normalize_pdf_text(text)
+                timings[stage] = round(time.perf_counter() - t0, 4)
+                stage = "extractors"
+                fields = versioned_fields(notice_id, text, timings)
+    except ExtractTimeout as e:
+        if e.stage is None:       # not inside run_extractors, which times its own stages
+            timings[stage] = round(time.perf_counter() - t0, 4)
+        timings["timed_out"] = e.stage or stage
+        fields = {}
+        if stage != "extractors":
+            text = ""
+    return {"text": text, "method": method, "fields": fields, "timings": timings}
+
+
+def add_timings(profile: Dict[str, Any], notice_id: str, timings: Optional[Dict[str, Any]]):
+    """Accumulate one notice's timings into a run profile: {stage: [docs, seconds, max, notice_id]}."""
+    for stage, secs in (timings or {}).items():
+        if stage == "timed_out":
+            continue
+        p = profile.setdefault(stage, [0, 0.0, 0.0, None])
+        p[0] += 1
+        p[1] += secs
+        if secs > p[2]:
+            p[2], p[3] = secs, notice_id
+
+
+def log_profile(profile: Dict[str, Any]):
+    """Per-stage totals of a run, most expensive first (finds the hot extractors)."""
+    if profile:
+        logging.info("Parse time per stage:")
+    for stage, (docs, total, worst, worst_id) in sorted(profile.items(), key=lambda kv: -kv[1][1]):
+        logging.info("  %-22s %6d docs %9.2fs total %8.1f ms avg, max %.2fs (%s)",
+                     stage, docs, total, total / docs * 1000, worst, worst_id)
+
+
+def store_result(writer: Dict[str, Any], texts: Dict[str, Any], search, row: dict,
+                 final_url: Optional[str], parsed: Dict[str, Any]) -> bool:
+    notice_id = row["notice_id"]
+    text = parsed["text"]
+    timings = parsed.get("timings") or {}
+    if timings.get("timed_out"):
+        # keep the text, so the notice can be replayed (BenchExtractors.py --ids)
+        if text:
+            TextStore.put(texts, notice_id, text)
+        queue_result(writer, notice_id, {"extraction_timings": timings}, "timeout")
+        logging.error(
+            "Extraction budget (%gs) exceeded in %s for %s; marked 'timeout'.",
+            EXTRACT_BUDGET_SECONDS, timings["timed_out"], notice_id,
+        )
+        return False
+    if not text:
+        queue_result(writer, notice_id, {"extraction_timings": timings}, "empty_text")
+        logging.warning(
+            "Empty text after extraction (method=%s) for %s", parsed["method"], notice_id
+        )
+        return False
+
+    # Keep a copy for re-parsing / debugging, searchable (TextSearch)
+    sha = TextStore.put(texts, notice_id, text)
+    if search is not None:
+        TextSearch.index_text(search, notice_id, text, sha)
+
+    memoize(writer, parsed["fields"])
+    queue_result(writer, notice_id, parsed["fields"], "ok")
+    logging.info(
+        "OK notice_id=%s | method=%s | from=%s\nPreview: %s",
+        notice_id,
+        parsed["method"],
+        final_url,
+        preview(text, 400),
+    )
+    return True
+
+
+# -------------------------
+# OFFLINE RE-PARSE
+# -------------------------
+def open_texts() -> Dict[str, Any]:
+    texts = TextStore.open_store()
+    if not TextStore.count(texts) and any(TEXT_DIR.glob("*.txt")):
+        logging.warning("%s is empty but %s has texts: run `python TextStore.py --migrate %s`.",
+                        texts["path"], TEXT_DIR, TEXT_DIR)
+    return texts
+
+
+def bounded_map(pool, fn, items: Iterable, window: int) -> Iterator:
+    """pool.map with at most `window` tasks in flight (results in completion order)."""
+    pending = set()
+    for item in items:
+        pending.add(pool.submit(fn, item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            yield fut.result()
+
+
+def reparse_text(item: Tuple[str, str]) -> Tuple[str, Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    (notice_id, fields, timings) for one stored text; fields is None if it
+    could not be parsed or ran past the budget (timings["timed_out"]).
+    """
+    notice_id, text = item
+    timings: Dict[str, Any] = {}
+    try:
+        if not text.strip():
+            return notice_id, None, timings
+        with time_budget():
+            fields = versioned_fields(notice_id, text, timings)
+        return notice_id, fields, timings
+    except ExtractTimeout as e:
+        timings["timed_out"] = e.stage or "extractors"
+        return notice_id, None, timings
+    except Exception as e:
+        logging.warning("Re-parse failed for %s: %r", notice_id, e)
+        return notice_id, None, timings
+
+
+def reparse(ids: Optional[List[str]] = None, limit: int = 0):
+    """
+    Re-run the field extractors over the stored texts (no download, no PDF
+    decoding) on PARSE_WORKERS processes, writing results WRITE_BATCH rows per
+    statement. Claims held by running workers are left alone.
+    """
+    texts = open_texts()
+    total = len(ids) if ids else TextStore.count(texts)
+    if limit > 0:
+        total = min(total, limit)
+    if not total:
+        logging.info("No texts to re-parse in %s.", texts["path"])
+        return
+
+    logging.info("Re-parsing up to %d texts from %s.", total, texts["path"])
+    conn = db_connect()
+    t0 = time.monotonic()
+    memo = ExtractMemo.open_memo()
+    writer = new_writer(conn, keep_claims=True, memo=memo)
+    profile: Dict[str, Any] = {}
+    done = failed = timeouts = 0
+    items = itertools.islice(TextStore.iter_texts(texts, ids), limit or None)
+    with ProcessPoolExecutor(max_workers=max(1, PARSE_WORKERS)) as pool:
+        for notice_id, fields, timings in bounded_map(pool, reparse_text, items, 4 * PARSE_WORKERS):
+            done += 1
+            add_timings(profile, notice_id, timings)
+            if timings.get("timed_out"):
+                # stored fields stay as they are
+                timeouts += 1
+                logging.error("Re-parse of %s exceeded the budget (%gs) in %s.",
+                              notice_id, EXTRACT_BUDGET_SECONDS, timings["timed_out"])
                 continue
+            if fields is None:
+                failed += 1
+                continue
+            # every extractor re-ran: what it no longer finds is cleared
+            fields["overwrite"] = [col for col in fields if col in EXTRACTED_COLUMNS]
+            memoize(writer, fields)
+            queue_result(writer, notice_id, fields, "ok")
+            if done % WRITE_BATCH == 0:
+                logging.info("Re-parsed %d/%d (%.0f docs/s).", done, total,
+                             done / (time.monotonic() - t0))
+    flush_results(writer)
+    memo.close()
+    TextStore.close_store(texts)
+    logging.info(
+        "Re-parse done in %.1fs: texts=%d, failed=%d, timeouts=%d, rows updated=%d.",
+        time.monotonic() - t0, done, failed, timeouts, writer["written"],
+    )
+    log_profile(profile)
 
-            text = normalize_pdf_text(text)
 
-            # Keep a copy for debugging/iteration
-            out_path = TEXT_DIR / f"{notice_id}.txt"
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(text)
+# -------------------------
+# SELECTIVE BACKFILL
+# -------------------------
+# Extracted notices whose stored versions do not cover EXTRACTOR_VERSIONS
+BACKFILL_SELECT_SQL = """
+SELECT notice_id, text_sha256, extractor_versions
+FROM public.notices_stage
+WHERE extraction_status = 'ok'
+  AND (extractor_versions IS NULL OR NOT extractor_versions @> %s::jsonb)
+ORDER BY notice_id
+"""
+
+
+def backfill_text(task: Tuple[str, str, List[str], Optional[str]]):
+    """
+    (notice_id, text, stale extractors, stored text hash) -> (notice_id, text
+    hash, {extractor: fields}, timings), with None for hash and fields if the
+    text is unusable or ran past the budget (timings["timed_out"]). A text
+    that no longer matches the stored hash gets every extractor.
+    """
+    notice_id, text, names, known_sha = task
+    timings: Dict[str, Any] = {}
+    try:
+        if not text.strip():
+            return notice_id, None, None, timings
+        sha = text_sha256(text)
+        if sha != known_sha:
+            names = list(EXTRACTORS)
+        with time_budget():
+            outs = run_extractors(notice_id, text, names, timings)
+        return notice_id, sha, outs, timings
+    except ExtractTimeout as e:
+        timings["timed_out"] = e.stage or "extractors"
+        return notice_id, None, None, timings
+    except Exception as e:
+        logging.warning("Backfill failed for %s: %r", notice_id, e)
+        return notice_id, None, None, timings
+
+
+def backfill(limit: int = 0, dry_run: bool = False):
+    """
+    Bring stored fields up to EXTRACTOR_VERSIONS: for every extracted notice,
+    re-run only the extractors whose version changed, on its stored text.
+    Results come from the ExtractMemo memo when this text was already run
+    through that extractor version; otherwise they are computed on
+    PARSE_WORKERS processes and memoized.
+    """
+    conn = db_connect()
+    ensure_schema(conn)
+    # named (server-side) cursor: needs its own connection with a transaction
+    read_conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    memo = ExtractMemo.open_memo()
+    texts = open_texts()
+    writer = new_writer(conn, keep_claims=True, memo=memo)
+    stats = {"notices": 0, "memo": 0, "parsed": 0, "no_text": 0, "failed": 0, "timeouts": 0}
+    per_extractor = {name: 0 for name in EXTRACTORS}
+    profile: Dict[str, Any] = {}
+    t0 = time.monotonic()
+
+    def store(notice_id: str, sha: str, outs: Dict[str, Dict[str, Any]], timings=None):
+        fields: Dict[str, Any] = {}
+        for out in outs.values():
+            fields.update(out)
+        # the re-run extractors' columns, NULL included (the version says they are current)
+        fields["overwrite"] = list(fields)
+        fields["text_sha256"] = sha
+        fields["extractor_versions"] = {name: EXTRACTOR_VERSIONS[name] for name in outs}
+        fields["extraction_timings"] = timings
+        queue_result(writer, notice_id, fields, "ok")
+
+    def finish(fut):
+        notice_id, sha, outs, timings = fut.result()
+        add_timings(profile, notice_id, timings)
+        if timings.get("timed_out"):
+            stats["timeouts"] += 1
+            logging.error("Backfill of %s exceeded the budget (%gs) in %s.",
+                          notice_id, EXTRACT_BUDGET_SECONDS, timings["timed_out"])
+            return
+        if outs is None:
+            stats["failed"] += 1
+            return
+        stats["parsed"] += 1
+        ExtractMemo.remember(memo, sha, {name: (EXTRACTOR_VERSIONS[name], f) for name, f in outs.items()})
+        store(notice_id, sha, outs, timings)
+        if stats["parsed"] % WRITE_BATCH == 0:
+            logging.info("Backfill: %d notices re-parsed (%.0f docs/s).", stats["parsed"],
+                         stats["parsed"] / (time.monotonic() - t0))
+
+    pool = ProcessPoolExecutor(max_workers=max(1, PARSE_WORKERS))
+    pending = set()
+    try:
+        with read_conn.cursor(name="extract_backfill") as cur:
+            cur.itersize = 2000
+            cur.execute(BACKFILL_SELECT_SQL, (Json(EXTRACTOR_VERSIONS),))
+            for notice_id, sha, versions in cur:
+                if limit > 0 and stats["notices"] >= limit:
+                    break
+                stats["notices"] += 1
+                versions = versions or {}
+                stale = [name for name, v in EXTRACTOR_VERSIONS.items() if versions.get(name) != v]
+                for name in stale:
+                    per_extractor[name] += 1
+                if dry_run:
+                    continue
+
+                if sha:
+                    hits = ExtractMemo.lookup(memo, sha, [(name, EXTRACTOR_VERSIONS[name]) for name in stale])
+                    if len(hits) == len(stale):
+                        stats["memo"] += 1
+                        store(notice_id, sha, hits)
+                        continue
+
+                text = TextStore.get(texts, notice_id)
+                if text is None:
+                    stats["no_text"] += 1
+                    continue
+                pending.add(pool.submit(backfill_text, (notice_id, text, stale, sha)))
+                while len(pending) >= 4 * PARSE_WORKERS:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        finish(fut)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                finish(fut)
+    finally:
+        pool.shutdown()
+        flush_results(writer)
+        memo.close()
+        TextStore.close_store(texts)
+        read_conn.close()
+
+    logging.info(
+        "Backfill %s in %.1fs: notices=%d (%s), from memo=%d, re-parsed=%d, no text=%d, "
+        "failed=%d, timeouts=%d, rows updated=%d.",
+        "plan" if dry_run else "done", time.monotonic() - t0, stats["notices"],
+        ", ".join(f"{name} x{n}" for name, n in per_extractor.items() if n) or "nothing stale",
+        stats["memo"], stats["parsed"], stats["no_text"], stats["failed"], stats["timeouts"],
+        writer["written"],
+    )
+    log_profile(profile)
+
+
+def _report_pid(pids):
+    """Parse worker initializer: tell kill_pool who we are."""
+    pids.put(os.getpid())
 
-            # Extract fields (NULL-on-unknown policy)
-            viso_sutarciu_verte = extract_viso_sutarciu_verte(text)
-            buyer, (budas, pagreitinta), desc = None, (None, None), None
-            try:
-                buyer = extract_buyer(text)
-                budas, pagreitinta = extract_procedure(text)
-                desc = extract_aprasymas(text)
-            except Exception:
-                # Never fail the whole notice on a single extractor
-                pass
-
-            lots = None
-            try:
-                lots = extract_lots(text)
-            except Exception as e:
-                logging.warning("extract_lots failed for %s: %r", notice_id, e)
-
-            extracted: Dict[str, Any] = {
-                # "buyer_name": buyer if buyer else None,
-                "pirkimo_budas": budas if budas else None,
-                "procedura_pagreitinta": (
-                    pagreitinta if pagreitinta is not None else None
-                ),
-                "aprasymas": desc if desc else None,
-                "lots": lots if lots else None,
-                "viso_sutarciu_verte": (
-                    viso_sutarciu_verte if viso_sutarciu_verte else None
-                ),
-            }
-
-            db_update_partial(conn, notice_id, extracted, status="ok")
-            logging.info(
-                "OK notice_id=%s | method=%s | from=%s\nPreview: %s",
-                notice_id,
-                method,
-                final_url,
-                preview(text, 400),
-            )
-            ok += 1
 
+def new_parse_pool():
+    """
+    Pool running parse_pdf: PARSE_WORKERS processes (PARSE_WORKERS=1: one
+    thread here, unless the budget needs a process, as SIGALRM only reaches a
+    main thread). Process workers report their pids to pool.worker_pids.
+    """
+    if PARSE_WORKERS > 1 or EXTRACT_BUDGET_SECONDS > 0:
+        pids = multiprocessing.SimpleQueue()
+        pool = ProcessPoolExecutor(max_workers=max(1, PARSE_WORKERS),
+                                   initializer=_report_pid, initargs=(pids,))
+        pool.worker_pids = pids
+        return pool
+    return ThreadPoolExecutor(max_workers=1)
+
+
+def kill_pool(pool):
+    """
+    Shut a parse pool down without waiting for hung workers: its workers
+    (still running children with a reported pid) are killed first.
+    """
+    pids = getattr(pool, "worker_pids", None)
+    if pids is not None:
+        mine = set()
+        while not pids.empty():
+            mine.add(pids.get())
+        for proc in multiprocessing.active_children():
+            if proc.pid in mine:
+                proc.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(conn, rows: List[dict], parser: Dict[str, Any], texts: Dict[str, Any], search,
+              profile: Dict[str, Any], memo=None) -> Tuple[int, int]:
+    """
+    Download, parse and store one claimed batch on parser["pool"], adding the
+    parse timings to `profile` and the extractor results to `memo`. Returns
+    (success, failed).
+
+    A task past PARSE_HARD_SECONDS is stored as 'timeout'; a worker that dies
+    breaks every task in flight. Either way the pool is replaced and the
+    other tasks are resubmitted; one in flight during two crashes is stored
+    as 'exception'.
+    """
+    ok = fail = 0
+
+    downloads: "queue.Queue" = queue.Queue(maxsize=DOWNLOAD_QUEUE_SIZE)
+    threading.Thread(target=download_stage, args=(rows, downloads), daemon=True).start()
+
+    # future -> {"row", "final_url", "src", "deadline", "crashes"}
+    pending: Dict[Any, Dict[str, Any]] = {}
+    retry: List[Dict[str, Any]] = []
+    writer = new_writer(conn, memo=memo)
+    renewed = time.monotonic()
+
+    def submit(task):
+        task["deadline"] = time.monotonic() + PARSE_HARD_SECONDS if PARSE_HARD_SECONDS > 0 else None
+        pending[parser["pool"].submit(parse_pdf, task["row"]["notice_id"], task["src"])] = task
+
+    def give_up(task, status: str, fields: Dict[str, Any], why: str):
+        nonlocal fail
+        logging.error("%s: notice_id=%s marked '%s'.", why, task["row"]["notice_id"], status)
+        queue_result(writer, task["row"]["notice_id"], fields, status)
+        fail += 1
+        discard(task["src"])
+
+    def restart(why: str, crashed: bool):
+        old, parser["pool"] = parser["pool"], new_parse_pool()
+        kill_pool(old)
+        tasks = list(pending.values()) + retry
+        pending.clear()
+        retry.clear()
+        logging.error("Parse pool replaced (%s); resubmitting %d tasks.", why, len(tasks))
+        for task in tasks:
+            if crashed:
+                task["crashes"] += 1
+                if task["crashes"] > 1:
+                    give_up(task, "exception", {}, "In flight during two worker crashes")
+                    continue
+            submit(task)
+
+    def finish(fut):
+        nonlocal ok, fail
+        task = pending.pop(fut)
+        notice_id = task["row"]["notice_id"]
+        try:
+            parsed = fut.result()
+        except BrokenProcessPool:
+            retry.append(task)
+            return
         except Exception as e:
             logging.exception("Failed on notice_id=%s: %r", notice_id, e)
-            try:
-                db_update_partial(conn, notice_id, {}, status="exception")
-            except Exception:
-                pass
+            queue_result(writer, notice_id, {}, "exception")
             fail += 1
+            discard(task["src"])
+            return
+        try:
+            add_timings(profile, notice_id, parsed.get("timings"))
+            if store_result(writer, texts, search, task["row"], task["final_url"], parsed):
+                ok += 1
+            else:
+                fail += 1
+        except Exception as e:
+            logging.exception("Failed on notice_id=%s: %r", notice_id, e)
+            queue_result(writer, notice_id, {}, "exception")
+            fail += 1
+        finally:
+            discard(task["src"])
+
+    def sweep(block: bool):
+        """Finish what is done (with block: wait for something, or the next deadline)."""
+        if block and pending:
+            deadlines = [t["deadline"] for t in pending.values() if t["deadline"] is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in [f for f in pending if f.done()]:
+            finish(fut)
+        if retry:
+            restart("a worker died", crashed=True)
+        now = time.monotonic()
+        overdue = [f for f, t in pending.items()
+                   if t["deadline"] is not None and t["deadline"] < now and not f.done()]
+        if overdue:
+            for fut in overdue:
+                give_up(pending.pop(fut), "timeout", {"extraction_timings": {"timed_out": "worker"}},
+                        f"Parse not done within {PARSE_HARD_SECONDS:g}s")
+            restart("hung worker", crashed=False)
+
+    i = 0
+    while True:
+        item = downloads.get()
+        if item is None:
+            break
+        row, data, final_url, failure = item
+        i += 1
+        notice_id = row["notice_id"]
+        logging.info("[%d/%d] notice_id=%s", i, len(rows), notice_id)
+
+        # keep the lease on the rest of the batch
+        if time.monotonic() - renewed > LEASE_SECONDS / 2:
+            renew_claims(conn)
+            renewed = time.monotonic()
+
+        if not data:
+            queue_result(writer, notice_id, {}, failure)
+            logging.warning("Could not download PDF for %s (%s)", notice_id, failure)
+            fail += 1
+            continue
+
+        task = {"row": row, "final_url": final_url, "src": data, "crashes": 0}
+        del data
+        try:
+            submit(task)
+        except BrokenProcessPool:
+            restart("a worker died", crashed=True)
+            submit(task)
+
+        # keep every worker busy plus one queued task each, no more
+        while len(pending) >= 2 * PARSE_WORKERS:
+            sweep(block=True)
+        sweep(block=False)
+
+    while pending:
+        sweep(block=True)
+    flush_results(writer)
+    # results that never reached the DB are failures, whatever their status
+    for _, status in writer["dropped"]:
+        if status == "ok":
+            ok -= 1
+            fail += 1
+    return ok, fail
 
-        time.sleep(random.uniform(0.2, 0.6))
 
-    logging.info("Done. success=%d, failed=%d.", ok, fail)
+def main():
+    conn = db_connect()
+    ensure_schema(conn)
+
+    # worker processes live for the whole run, unless run_batch replaces them
+    parser = {"pool": new_parse_pool()}
+    texts = open_texts()
+    search = TextSearch.open_index()
+    memo = ExtractMemo.open_memo()
+
+    ok = fail = batches = 0
+    profile: Dict[str, Any] = {}
+    started = db_now(conn)
+    try:
+        while MAX_BATCHES <= 0 or batches < MAX_BATCHES:
+            rows = claim_work(conn, BATCH_LIMIT, started)
+            if not rows:
+                break
+            batches += 1
+            logging.info("Batch %d: %s claimed %d notices.", batches, WORKER_ID, len(rows))
+            b_ok, b_fail = run_batch(conn, rows, parser, texts, search, profile, memo)
+            ok += b_ok
+            fail += b_fail
+    finally:
+        parser["pool"].shutdown()
+        TextStore.close_store(texts)
+        memo.close()
+        if search is not None:
+            search.close()
+        try:
+            release_claims(conn)
+        except Exception:
+            pass
+
+    if not batches:
+        logging.info("No notices waiting for extraction.")
+        return
+    logging.info("Done. batches=%d, success=%d, failed=%d.", batches, ok, fail)
+    log_profile(profile)
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Extract notice fields from PDFs into notices_stage.")
+    ap.add_argument("--reparse", action="store_true",
+                    help="re-run the extractors over the stored texts instead of downloading PDFs")
+    ap.add_argument("--backfill", action="store_true",
+                    help="re-run only the extractors whose version changed (EXTRACTOR_VERSIONS)")
+    ap.add_argument("--dry-run", action="store_true", help="with --backfill: only count what is stale")
+    ap.add_argument("--resolve", action="store_true",
+                    help="resolve the PDF links behind queued notice URLs into PdfCache (no PDF downloads)")
+    ap.add_argument("--requeue", action="store_true",
+                    help="put dead-lettered notices back in the queue (all, or --ids / --error)")
+    ap.add_argument("--error", help="with --requeue: only notices whose last failure was this status")
+    ap.add_argument("--ids", help="comma-separated notice_ids to re-parse / requeue / resolve (default: all)")
+    ap.add_argument("--limit", type=int, default=0, help="re-parse / backfill / resolve at most this many")
+    args = ap.parse_args()
+    ids = [i.strip() for i in args.ids.split(",") if i.strip()] if args.ids else None
+    if args.resolve:
+        warm_resolutions(ids, args.limit)
+    elif args.requeue:
+        requeue(ids, args.error)
+    elif args.backfill:
+        backfill(args.limit, args.dry_run)
+    elif args.reparse:
+        reparse(ids, args.limit)
+    else:
+        main()
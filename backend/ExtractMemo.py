@@ -0,0 +1,97 @@
+"""
+Memo of field-extractor results for ExtractFromPDFs.py, kept in SQLite:
+(sha256 of the normalized text, extractor name, extractor version) -> the
+DB fields that extractor produced (zlib-compressed JSON).
+
+Every ExtractFromPDFs.py run that executes the extractors (extraction,
+--reparse, --backfill) records their results here; `--backfill` looks them
+up before running an extractor, so notices sharing a text, or a version that
+was rolled back, cost no parsing.
+
+  python ExtractMemo.py             # entries per extractor/version
+  python ExtractMemo.py --drop lots:1   # forget one extractor version
+"""
+
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+EXTRACT_MEMO_DB = os.getenv("EXTRACT_MEMO_DB", "extract_memo.sqlite")
+
+MEMO_SQL = """
+CREATE TABLE IF NOT EXISTS results (
+    text_sha256 TEXT NOT NULL,
+    extractor   TEXT NOT NULL,
+    version     INTEGER NOT NULL,
+    fields      BLOB NOT NULL,
+    PRIMARY KEY (text_sha256, extractor, version)
+) WITHOUT ROWID;
+"""
+
+
+def open_memo(path: str = EXTRACT_MEMO_DB) -> sqlite3.Connection:
+    memo = sqlite3.connect(path)
+    memo.execute("PRAGMA journal_mode=WAL")
+    memo.execute("PRAGMA synchronous=NORMAL")
+    memo.execute(MEMO_SQL)
+    memo.commit()
+    return memo
+
+def lookup(memo: sqlite3.Connection, sha: str, wanted: Iterable[Tuple[str, int]]) -> Dict[str, Dict[str, Any]]:
+    """{extractor: fields} for the (extractor, version) pairs memoized for this text."""
+    found: Dict[str, Dict[str, Any]] = {}
+    for name, version in wanted:
+        row = memo.execute(
+            "SELECT fields FROM results WHERE text_sha256 = ? AND extractor = ? AND version = ?",
+            (sha, name, version),
+        ).fetchone()
+        if row:
+            found[name] = json.loads(zlib.decompress(row[0]))
+    return found
+
+def remember(memo: sqlite3.Connection, sha: str, results: Dict[str, Tuple[int, Dict[str, Any]]]):
+    """Store {extractor: (version, fields)} for one text. Committed by the caller."""
+    memo.executemany(
+        "INSERT OR REPLACE INTO results (text_sha256, extractor, version, fields) VALUES (?, ?, ?, ?)",
+        [
+            (sha, name, version, zlib.compress(json.dumps(fields, ensure_ascii=False).encode("utf-8")))
+            for name, (version, fields) in results.items()
+        ],
+    )
+
+def counts(memo: sqlite3.Connection) -> List[Tuple[str, int, int]]:
+    return memo.execute(
+        "SELECT extractor, version, COUNT(*) FROM results GROUP BY extractor, version ORDER BY 1, 2"
+    ).fetchall()
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Inspect the ExtractFromPDFs.py extractor memo.")
+    ap.add_argument("--drop", metavar="NAME:VERSION", help="delete the entries of one extractor version")
+    ap.add_argument("--path", default=EXTRACT_MEMO_DB)
+    args = ap.parse_args(argv)
+
+    memo = open_memo(args.path)
+    if args.drop:
+        name, _, version = args.drop.partition(":")
+        n = memo.execute("DELETE FROM results WHERE extractor = ? AND version = ?", (name, int(version))).rowcount
+        memo.commit()
+        print(f"Dropped {n} entries of {name} v{version}.")
+    for name, version, n in counts(memo):
+        print(f"{name} v{version}: {n}")
+    memo.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
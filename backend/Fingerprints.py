@@ -0,0 +1,164 @@
+"""
+Local fingerprint index for Scrape.py: notice_id -> hash of the listing
+columns as they are in notices_stage, kept in SQLite. Rows whose hash matches
+are known unchanged and never sent to Postgres.
+
+Two hashes per notice, mirroring UPSERT_SQL:
+  h   (title, skelbimo_tipas, publish_date, pdf_urls)
+  hb  buyer_name -- an empty scraped buyer_name never overwrites the DB value,
+      so it only counts as a change when non-empty
+
+  python Fingerprints.py             # entries in the index
+  python Fingerprints.py --rebuild   # reload it from notices_stage (one bulk query)
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+FINGERPRINT_DB = os.getenv("FINGERPRINT_DB", "fingerprints.sqlite")
+
+INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    notice_id TEXT PRIMARY KEY,
+    h         BLOB NOT NULL,
+    hb        BLOB
+) WITHOUT ROWID;
+"""
+
+REBUILD_SELECT_SQL = """
+SELECT notice_id, title, skelbimo_tipas, publish_date, pdf_urls, buyer_name
+FROM notices_stage;
+"""
+
+LOOKUP_CHUNK = 500  # SQLite host-parameter limit is 999 on old builds
+
+
+def _digest(values: List[Any]) -> bytes:
+    # str() of a datetime matches what COPY sends (isoformat, " " separator)
+    return hashlib.blake2b(
+        json.dumps(values, ensure_ascii=False, default=str).encode("utf-8"), digest_size=16
+    ).digest()
+
+def row_hashes(row: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """(h, hb) for a scraped row or a notices_stage row."""
+    return (
+        _digest([row.get("title"), row.get("skelbimo_tipas"), row.get("publish_date"), row.get("pdf_urls")]),
+        _digest([row.get("buyer_name")]),
+    )
+
+# -------------------------------------------------------
+# Index
+# -------------------------------------------------------
+
+def open_index(path: str = FINGERPRINT_DB) -> sqlite3.Connection:
+    # used from the DB writer's worker threads, one call at a time
+    idx = sqlite3.connect(path, check_same_thread=False)
+    idx.execute("PRAGMA journal_mode=WAL")
+    idx.execute("PRAGMA synchronous=NORMAL")
+    idx.execute(INDEX_SQL)
+    idx.commit()
+    return idx
+
+def lookup(idx: sqlite3.Connection, ids: Iterable[str]) -> Dict[str, Tuple[bytes, Optional[bytes]]]:
+    ids = list(dict.fromkeys(ids))
+    found: Dict[str, Tuple[bytes, Optional[bytes]]] = {}
+    for i in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[i:i + LOOKUP_CHUNK]
+        cur = idx.execute(
+            f"SELECT notice_id, h, hb FROM fingerprints WHERE notice_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for nid, h, hb in cur:
+            found[nid] = (h, hb)
+    return found
+
+def is_unchanged(known: Optional[Tuple[bytes, Optional[bytes]]], row: Dict[str, Any]) -> bool:
+    """True if upserting `row` would leave the indexed notice as it is."""
+    if known is None:
+        return False
+    h, hb = row_hashes(row)
+    if h != known[0]:
+        return False
+    return not row.get("buyer_name") or hb == known[1]
+
+def remember(idx: sqlite3.Connection, rows: Iterable[Dict[str, Any]]):
+    """Record rows that are now in notices_stage (call after the Postgres commit)."""
+    recs = []
+    for r in rows:
+        h, hb = row_hashes(r)
+        # empty buyer_name was not written; keep whatever the index had
+        recs.append((r["notice_id"], h, hb if r.get("buyer_name") else None))
+    idx.executemany(
+        """
+        INSERT INTO fingerprints (notice_id, h, hb) VALUES (?, ?, ?)
+        ON CONFLICT (notice_id) DO UPDATE SET
+            h  = excluded.h,
+            hb = COALESCE(excluded.hb, fingerprints.hb)
+        """,
+        recs,
+    )
+    idx.commit()
+
+def rebuild(idx: sqlite3.Connection, pg_conn) -> int:
+    """Replace the index with the current contents of notices_stage. Returns the entry count."""
+    n = 0
+    idx.execute("DELETE FROM fingerprints")
+    # server-side cursor: streams the table instead of loading it at once
+    with pg_conn.cursor(name="fingerprint_rebuild") as cur:
+        cur.itersize = 10000
+        cur.execute(REBUILD_SELECT_SQL)
+        batch = []
+        for nid, title, tipas, pdate, pdf_urls, buyer in cur:
+            h, hb = row_hashes({"title": title, "skelbimo_tipas": tipas, "publish_date": pdate,
+                                "pdf_urls": pdf_urls, "buyer_name": buyer})
+            batch.append((nid, h, hb))
+            if len(batch) >= 10000:
+                idx.executemany("INSERT INTO fingerprints (notice_id, h, hb) VALUES (?, ?, ?)", batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            idx.executemany("INSERT INTO fingerprints (notice_id, h, hb) VALUES (?, ?, ?)", batch)
+            n += len(batch)
+    pg_conn.commit()
+    idx.commit()
+    return n
+
+def count(idx: sqlite3.Connection) -> int:
+    return idx.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Inspect/rebuild the Scrape.py fingerprint index.")
+    ap.add_argument("--rebuild", action="store_true", help="reload the index from notices_stage")
+    ap.add_argument("--path", default=FINGERPRINT_DB)
+    args = ap.parse_args(argv)
+
+    idx = open_index(args.path)
+    if args.rebuild:
+        import psycopg2
+        from dotenv import load_dotenv
+        load_dotenv()
+        pg = psycopg2.connect(os.getenv("DATABASE_URL"))
+        try:
+            print(f"Rebuilt {args.path}: {rebuild(idx, pg)} notices.")
+        finally:
+            pg.close()
+    else:
+        print(f"{args.path}: {count(idx)} notices.")
+    idx.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
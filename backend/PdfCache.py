@@ -0,0 +1,169 @@
+"""
+Content-addressed PDF store for ExtractFromPDFs.py.
+
+  PDF_CACHE_DIR/blobs/<sha[:2]>/<sha256>.pdf   one file per distinct PDF
+  PDF_CACHE_DIR/index.sqlite                   per URL: sha256, ETag,
+                                               Last-Modified, final URL;
+                                               per detail page: its PDF link
+
+A notice's detail page URL maps to the PDF it resolved to, so a 304 on the
+detail page skips the PDF request as well. Notices sharing a PDF share a blob.
+
+Resolutions remember which .pdf link of a detail page is the PDF (or that
+none is), so later fetches skip the page. A negative result is trusted for
+RESOLVE_NEGATIVE_SECONDS; a positive one until its link stops serving a PDF.
+"""
+
+import os
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+# "" disables the cache
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+RESOLVE_NEGATIVE_SECONDS = int(os.getenv("RESOLVE_NEGATIVE_SECONDS", str(12 * 3600)))
+
+INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS urls (
+    url           TEXT PRIMARY KEY,
+    sha256        TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    final_url     TEXT,
+    fetched_at    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resolutions (
+    url         TEXT PRIMARY KEY,
+    pdf_url     TEXT,                -- NULL: no PDF behind this page
+    resolved_at TEXT NOT NULL
+);
+"""
+
+
+def open_cache(base_dir: str = PDF_CACHE_DIR) -> Optional[Dict[str, Any]]:
+    """Cache handle (shared by the download threads), or None if disabled."""
+    if not base_dir:
+        return None
+    os.makedirs(os.path.join(base_dir, "blobs"), exist_ok=True)
+    db = sqlite3.connect(os.path.join(base_dir, "index.sqlite"), check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(INDEX_SQL)
+    db.commit()
+    return {"dir": base_dir, "db": db, "lock": threading.Lock()}
+
+def blob_path(cache: Dict[str, Any], sha: str) -> str:
+    return os.path.join(cache["dir"], "blobs", sha[:2], sha + ".pdf")
+
+def lookup(cache: Optional[Dict[str, Any]], url: str) -> Optional[Dict[str, Any]]:
+    """Stored entry for `url` whose blob is still on disk, else None."""
+    if cache is None:
+        return None
+    with cache["lock"]:
+        row = cache["db"].execute(
+            "SELECT sha256, etag, last_modified, final_url FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+    if not row or not os.path.exists(blob_path(cache, row[0])):
+        return None
+    return {"sha256": row[0], "etag": row[1], "last_modified": row[2], "final_url": row[3]}
+
+def conditional_headers(meta: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if meta:
+        if meta["etag"]:
+            headers["If-None-Match"] = meta["etag"]
+        if meta["last_modified"]:
+            headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+def read(cache: Dict[str, Any], sha: str, max_inline: int = 0):
+    """Blob contents, or just its path when larger than `max_inline` bytes (> 0)."""
+    path = blob_path(cache, sha)
+    if max_inline > 0 and os.path.getsize(path) > max_inline:
+        return path
+    with open(path, "rb") as f:
+        return f.read()
+
+def put_blob(cache: Dict[str, Any], data: bytes, sha: Optional[str] = None) -> str:
+    """Store `data` once under its sha256 (atomic rename). Returns the hash."""
+    sha = sha or hashlib.sha256(data).hexdigest()
+    path = blob_path(cache, sha)
+    if not os.path.exists(path):
+        fd, tmp = tempfile.mkstemp(dir=spill_dir(cache), suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        adopt_file(cache, tmp, sha)
+    return sha
+
+def spill_dir(cache: Dict[str, Any]) -> str:
+    """Where downloads are streamed before adopt_file (same filesystem as the blobs)."""
+    path = os.path.join(cache["dir"], "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def adopt_file(cache: Dict[str, Any], tmp_path: str, sha: str) -> str:
+    """Move a downloaded file into the store as blob `sha` (or drop it if already there)."""
+    path = blob_path(cache, sha)
+    if os.path.exists(path):
+        os.unlink(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+def remember(cache: Optional[Dict[str, Any]], url: str, headers, sha: str, final_url: str):
+    """Record what `url` resolved to, with the validators from its response headers."""
+    if cache is None:
+        return
+    with cache["lock"]:
+        cache["db"].execute(
+            """
+            INSERT INTO urls (url, sha256, etag, last_modified, final_url, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                sha256 = excluded.sha256, etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                final_url = excluded.final_url, fetched_at = excluded.fetched_at
+            """,
+            (url, sha, headers.get("ETag"), headers.get("Last-Modified"), final_url,
+             datetime.now().isoformat(timespec="seconds")),
+        )
+        cache["db"].commit()
+
+def resolution(cache: Optional[Dict[str, Any]], url: str) -> Optional[Dict[str, Any]]:
+    """{"pdf_url", "resolved_at"} for a page (pdf_url None: no PDF), unless unknown or an expired negative."""
+    if cache is None:
+        return None
+    with cache["lock"]:
+        row = cache["db"].execute(
+            "SELECT pdf_url, resolved_at FROM resolutions WHERE url = ?", (url,)
+        ).fetchone()
+    if not row:
+        return None
+    if row[0] is None and datetime.fromisoformat(row[1]) < datetime.now() - timedelta(seconds=RESOLVE_NEGATIVE_SECONDS):
+        return None
+    return {"pdf_url": row[0], "resolved_at": row[1]}
+
+def remember_resolution(cache: Optional[Dict[str, Any]], url: str, pdf_url: Optional[str]):
+    """Record the PDF link behind page `url` (None: there is none)."""
+    if cache is None:
+        return
+    with cache["lock"]:
+        cache["db"].execute(
+            "INSERT OR REPLACE INTO resolutions (url, pdf_url, resolved_at) VALUES (?, ?, ?)",
+            (url, pdf_url, datetime.now().isoformat(timespec="seconds")),
+        )
+        cache["db"].commit()
+
+def forget_resolution(cache: Optional[Dict[str, Any]], url: str):
+    if cache is None:
+        return
+    with cache["lock"]:
+        cache["db"].execute("DELETE FROM resolutions WHERE url = ?", (url,))
+        cache["db"].commit()
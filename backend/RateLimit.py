@@ -0,0 +1,111 @@
+"""
+Adaptive per-host rate limiter shared by Scrape.py and ExtractFromPDFs.py.
+
+Token bucket per host whose refill rate follows AIMD:
+  - additive increase (+RATE_INCREASE req/s) after a fast, successful response
+  - multiplicative decrease (x RATE_DECREASE) on 429, 5xx or a timeout/connection error
+A Retry-After header on 429/503 additionally blocks the host for that long.
+
+Usage (sync / threads):
+    RateLimit.wait(url)
+    t0 = time.monotonic(); resp = session.get(url)
+    RateLimit.report(url, time.monotonic() - t0, status=resp.status_code)
+Usage (asyncio): `await RateLimit.wait_async(url)`, then report() the same way.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+RATE_START = float(os.getenv("RATE_START", "1.0"))      # req/s per host at start
+RATE_MIN = float(os.getenv("RATE_MIN", "0.2"))
+RATE_MAX = float(os.getenv("RATE_MAX", "5.0"))
+RATE_INCREASE = float(os.getenv("RATE_INCREASE", "0.1"))  # additive step, req/s
+RATE_DECREASE = float(os.getenv("RATE_DECREASE", "0.5"))  # multiplicative factor
+RATE_BURST = float(os.getenv("RATE_BURST", "1"))          # bucket capacity (tokens)
+# only speed up while responses come back faster than this (seconds)
+RATE_TARGET_LATENCY = float(os.getenv("RATE_TARGET_LATENCY", "1.5"))
+
+_LOCK = threading.Lock()
+_BUCKETS: Dict[str, Dict[str, Any]] = {}
+
+
+def host_of(url_or_host: str) -> str:
+    return urlsplit(url_or_host).netloc or url_or_host
+
+def _bucket(host: str) -> Dict[str, Any]:
+    b = _BUCKETS.get(host)
+    if b is None:
+        b = _BUCKETS[host] = {
+            "rate": RATE_START,
+            "tokens": RATE_BURST,
+            "last": time.monotonic(),
+            "blocked_until": 0.0,
+        }
+    return b
+
+def reserve(url_or_host: str) -> float:
+    """Take one token for the host; returns how many seconds the caller must wait first."""
+    host = host_of(url_or_host)
+    with _LOCK:
+        b = _bucket(host)
+        now = time.monotonic()
+        b["tokens"] = min(RATE_BURST, b["tokens"] + (now - b["last"]) * b["rate"])
+        b["last"] = now
+        b["tokens"] -= 1.0
+        delay = 0.0 if b["tokens"] >= 0 else -b["tokens"] / b["rate"]
+        return max(delay, b["blocked_until"] - now)
+
+def wait(url_or_host: str) -> float:
+    """Blocking wait for the host's next slot. Returns the seconds slept."""
+    delay = reserve(url_or_host)
+    if delay > 0:
+        time.sleep(delay)
+    return delay
+
+async def wait_async(url_or_host: str) -> float:
+    delay = reserve(url_or_host)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+def report(url_or_host: str, latency: float, status: Optional[int] = None,
+           error: bool = False, retry_after: Optional[float] = None):
+    """
+    Feed back the outcome of one request.
+    `error=True` for timeouts / connection failures (no status).
+    """
+    host = host_of(url_or_host)
+    with _LOCK:
+        b = _bucket(host)
+        old = b["rate"]
+        if error or status == 429 or (status is not None and status >= 500):
+            b["rate"] = max(RATE_MIN, old * RATE_DECREASE)
+            if retry_after:
+                b["blocked_until"] = max(b["blocked_until"], time.monotonic() + retry_after)
+            logging.warning(
+                "RateLimit %s: %s -> %.2f req/s (was %.2f)",
+                host, "error" if error else f"HTTP {status}", b["rate"], old,
+            )
+        elif latency <= RATE_TARGET_LATENCY:
+            b["rate"] = min(RATE_MAX, old + RATE_INCREASE)
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Retry-After in seconds (numeric form only), or None."""
+    v = (headers or {}).get("Retry-After")
+    try:
+        return float(v) if v is not None else None
+    except ValueError:
+        return None
+
+def current_rate(url_or_host: str) -> float:
+    with _LOCK:
+        return _bucket(host_of(url_or_host))["rate"]
@@ -0,0 +1,263 @@
+"""
+Append-only NDJSON run artifacts for Scrape.py.
+
+Every run gets its own directory ARTIFACTS_DIR/<run_id>/ with one file per
+stream (notices, attempts, skipped_invalid), written page by page so a crash
+keeps everything up to the last page. Optional gzip / zstd compression.
+A finished run adds insert_report.json and run.json (run id, resume point,
+rows the fingerprint index kept from Postgres).
+
+Reading back:
+  python RunArtifacts.py                      # list runs
+  python RunArtifacts.py runs/<run_id>        # per-stream record counts
+  python RunArtifacts.py runs/<run_id> --stream attempts --csv attempts_vs_db.csv
+  python RunArtifacts.py runs/<run_id> --stream notices --json notices.json
+"""
+
+import os
+import io
+import sys
+import csv
+import json
+import gzip
+import zlib
+import shutil
+import argparse
+from datetime import datetime, date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "runs")
+# "none" | "gzip" | "zstd" (zstd needs the optional `zstandard` package)
+ARTIFACTS_COMPRESSION = os.getenv("ARTIFACTS_COMPRESSION", "gzip").strip().lower()
+# keep this many run directories, delete older ones (0 = keep all)
+ARTIFACTS_KEEP = int(os.getenv("ARTIFACTS_KEEP", "20"))
+
+SUFFIX = {"none": ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def json_serial(obj):
+    """JSON serializer for objects not serializable by default json code"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+# -------------------------------------------------------
+# Writing
+# -------------------------------------------------------
+
+def _open_writer(path: str, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, "ab")
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "ab"))
+    return open(path, "ab")
+
+def _flush(fh, compression: str):
+    # make everything written so far decodable, even if the process dies next
+    if compression == "gzip":
+        fh.flush()  # Z_SYNC_FLUSH
+    elif compression == "zstd":
+        import zstandard
+        fh.flush(zstandard.FLUSH_FRAME)
+    else:
+        fh.flush()
+
+def _rotate(base_dir: str, keep: int, current: Optional[str] = None):
+    """Delete the oldest run directories so that `keep` remain besides `current` (keep=0: all go)."""
+    if not os.path.isdir(base_dir):
+        return
+    runs = sorted(d for d in os.listdir(base_dir)
+                  if d != current and os.path.isdir(os.path.join(base_dir, d)))
+    for d in runs[:max(0, len(runs) - keep)]:
+        shutil.rmtree(os.path.join(base_dir, d), ignore_errors=True)
+
+def start_run(base_dir: str = ARTIFACTS_DIR, compression: str = ARTIFACTS_COMPRESSION,
+              keep: int = ARTIFACTS_KEEP, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Create ARTIFACTS_DIR/<run_id>/ (rotating old runs) and return the writer
+    state. A given run_id (a resumed run) reuses its directory; a new one is
+    timestamped to the microsecond and never shares a directory.
+    """
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("zstandard not installed; writing gzip artifacts instead.")
+            compression = "gzip"
+    if compression not in SUFFIX:
+        compression = "none"
+
+    resumed = run_id is not None
+    run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    if keep > 0:
+        # the run we are about to create (or resume) counts towards `keep`
+        _rotate(base_dir, keep - 1, current=run_id)
+    run_dir = os.path.join(base_dir, run_id)
+    os.makedirs(run_dir, exist_ok=resumed)
+    return {
+        "run_id": run_id,
+        "dir": run_dir,
+        "compression": compression,
+        "files": {},
+        "counts": {},
+    }
+
+def append(art: Dict[str, Any], stream: str, records: Iterable[Dict[str, Any]]) -> int:
+    """Append records to <stream>.ndjson[.gz|.zst] and flush. Returns how many were written."""
+    n = 0
+    buf = io.StringIO()
+    for rec in records:
+        buf.write(json.dumps(rec, ensure_ascii=False, default=json_serial))
+        buf.write("\n")
+        n += 1
+    if n:
+        fh = art["files"].get(stream)
+        if fh is None:
+            path = os.path.join(art["dir"], stream + SUFFIX[art["compression"]])
+            fh = art["files"][stream] = _open_writer(path, art["compression"])
+        fh.write(buf.getvalue().encode("utf-8"))
+        _flush(fh, art["compression"])
+    art["counts"][stream] = art["counts"].get(stream, 0) + n
+    return n
+
+def write_json(art: Dict[str, Any], name: str, obj: Any):
+    """Small one-shot JSON file (e.g. the run report) next to the streams."""
+    with open(os.path.join(art["dir"], name), "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2, default=json_serial)
+
+def close_run(art: Dict[str, Any]):
+    for fh in art["files"].values():
+        try:
+            fh.close()
+        except Exception:
+            pass
+    art["files"] = {}
+
+# -------------------------------------------------------
+# Reading
+# -------------------------------------------------------
+
+def _iter_chunks(path: str) -> Iterator[bytes]:
+    """Decompressed bytes of an artifact; stops quietly at a truncated/torn end."""
+    if path.endswith(".gz"):
+        # zlib directly: gzip.GzipFile drops data already decoded when the
+        # file ends without a trailer (crashed run)
+        with open(path, "rb") as raw:
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            while True:
+                chunk = raw.read(1 << 16)
+                if not chunk:
+                    return
+                while chunk:
+                    try:
+                        yield d.decompress(chunk)
+                    except zlib.error:
+                        return
+                    if not d.eof:
+                        break
+                    # next gzip member (file was appended to)
+                    chunk = d.unused_data
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif path.endswith(".zst"):
+        import zstandard
+        with open(path, "rb") as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            while True:
+                try:
+                    chunk = reader.read(1 << 16)
+                except zstandard.ZstdError:
+                    return
+                if not chunk:
+                    return
+                yield chunk
+    else:
+        with open(path, "rb") as raw:
+            while True:
+                chunk = raw.read(1 << 16)
+                if not chunk:
+                    return
+                yield chunk
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield records from one NDJSON artifact. A torn tail (crash mid-write) is
+    ignored instead of raising.
+    """
+    pending = b""
+    for chunk in _iter_chunks(path):
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if pending.strip():
+        try:
+            yield json.loads(pending)
+        except ValueError:
+            pass
+
+def stream_path(run_dir: str, stream: str) -> Optional[str]:
+    for suffix in SUFFIX.values():
+        p = os.path.join(run_dir, stream + suffix)
+        if os.path.exists(p):
+            return p
+    return None
+
+def read_stream(run_dir: str, stream: str) -> Iterator[Dict[str, Any]]:
+    """Records of one stream of a run directory (empty if the stream was never written)."""
+    p = stream_path(run_dir, stream)
+    if p:
+        yield from read_records(p)
+
+def list_runs(base_dir: str = ARTIFACTS_DIR) -> List[str]:
+    if not os.path.isdir(base_dir):
+        return []
+    return sorted(d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d)))
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Inspect/export Scrape.py run artifacts.")
+    ap.add_argument("run_dir", nargs="?", help="runs/<run_id> (omit to list runs)")
+    ap.add_argument("--stream", default="notices", help="notices | attempts | skipped_invalid")
+    ap.add_argument("--json", dest="json_out", help="write the stream as one JSON array")
+    ap.add_argument("--csv", dest="csv_out", help="write the stream as CSV")
+    args = ap.parse_args(argv)
+
+    if not args.run_dir:
+        for r in list_runs():
+            print(r)
+        return
+
+    if not (args.json_out or args.csv_out):
+        for name in ("notices", "attempts", "skipped_invalid"):
+            p = stream_path(args.run_dir, name)
+            n = sum(1 for _ in read_records(p)) if p else 0
+            print(f"{name}: {n} records" + (f" ({p})" if p else ""))
+        return
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(list(read_stream(args.run_dir, args.stream)), f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.json_out}")
+
+    if args.csv_out:
+        w = None
+        with open(args.csv_out, "w", newline="", encoding="utf-8") as f:
+            for rec in read_stream(args.run_dir, args.stream):
+                if w is None:
+                    w = csv.DictWriter(f, fieldnames=list(rec.keys()), extrasaction="ignore")
+                    w.writeheader()
+                w.writerow(rec)
+        print(f"Wrote {args.csv_out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,16 +1,29 @@
 import os
 import re
+import io
 import json
-import csv
+import time
+import base64
 import asyncio
-from datetime import datetime, date
+import zipfile
+import argparse
+from datetime import datetime
 from typing import List, Dict, Any, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
 
 import psycopg2
-from psycopg2.extras import execute_values
+import requests
+import lxml.html
+from psycopg2.extras import Json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
 
+import RateLimit
+import Fingerprints
+import RunArtifacts
+
 # -------------------------------------------------------
 # Config
 # -------------------------------------------------------
@@ -25,13 +38,79 @@ START_URL = (
 #   - set PAGE_LIMIT = 0 (or unset) to scrape ALL pages
 PAGE_LIMIT = int(os.getenv("PAGE_LIMIT", "0"))
 
+# SCRAPE MODE:
+#   - "http"    (default): fetch listing pages with a pooled HTTP session and
+#                parse them with lxml; fall back to Playwright only if the
+#                HTML shape is not recognised
+#   - "browser": always drive Chromium through Playwright
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "http").strip().lower()
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36")
+
 # If True: we open the detail page (whose URL we now store in pdf_urls)
 # and optionally extract .pdf links there (not stored; only for debugging).
 EXTRACT_PDFS = False
 PDF_CONCURRENCY = 4
 
-# polite delay between pages
-PER_REQUEST_WAIT_MS = (600, 1200)  # (min,max) ms
+# polite pacing: every page load goes through the adaptive per-host limiter
+# in RateLimit.py (RATE_START / RATE_MIN / RATE_MAX / ... env vars)
+
+# SHARDS:
+#   - SHARDS > 1 loads pages in parallel: shard k goes straight to pages
+#     k+1, k+1+SHARDS, k+1+2*SHARDS, ... by URL (one browser context per shard
+#     in browser mode); rows are merged with dedup on notice_id
+#   - SHARD_CONCURRENCY caps page loads in flight across ALL shards
+SHARDS = int(os.getenv("SHARDS", "1"))
+SHARD_CONCURRENCY = int(os.getenv("SHARD_CONCURRENCY", "3"))
+
+# INCREMENTAL MODE:
+#   - INCREMENTAL_STOP_PAGES = K > 0: stop after K consecutive pages holding only
+#     known, unchanged notices at or below the high-water mark (newest
+#     publish_date / notice_id already in notices_stage)
+#   - INCREMENTAL_STOP_PAGES = 0: always walk the whole listing
+#   - FULL_SWEEP=1 forces a full walk; FULL_SWEEP_EVERY_H > 0 does one
+#     automatically when the last full sweep is older than that many hours
+INCREMENTAL_STOP_PAGES = int(os.getenv("INCREMENTAL_STOP_PAGES", "3"))
+FULL_SWEEP = os.getenv("FULL_SWEEP", "0") == "1"
+FULL_SWEEP_EVERY_H = int(os.getenv("FULL_SWEEP_EVERY_H", "24"))
+
+# DB WRITER:
+#   - DB_WRITER=1 (default): scraped pages go through a bounded queue to a
+#     writer task that upserts on a worker thread, coalescing up to
+#     WRITER_BATCH_PAGES waiting pages per transaction; scraping pauses once
+#     WRITER_QUEUE_PAGES pages are waiting (backpressure)
+#   - DB_WRITER=0: upsert inline after every page
+DB_WRITER = os.getenv("DB_WRITER", "1") == "1"
+WRITER_QUEUE_PAGES = int(os.getenv("WRITER_QUEUE_PAGES", "4"))
+WRITER_BATCH_PAGES = int(os.getenv("WRITER_BATCH_PAGES", "4"))
+
+# HTTP ARCHIVE (Playwright sessions):
+#   - HTTP_ARCHIVE=record: save every response of the browser session to the
+#     HAR at HTTP_ARCHIVE_PATH (.zip keeps bodies as separate files)
+#   - HTTP_ARCHIVE=replay: serve responses from that HAR through request
+#     routing, no network; anything not in the archive is aborted
+#   Either mode runs the browser path with a single context (no HTTP mode, no shards).
+#   `python Scrape.py --bench-replay` benchmarks parsing over the archived pages.
+HTTP_ARCHIVE = os.getenv("HTTP_ARCHIVE", "").strip().lower()
+HTTP_ARCHIVE_PATH = os.getenv("HTTP_ARCHIVE_PATH", "replay/listing.har.zip")
+
+# CHECKPOINTS:
+#   - after every committed page, scrape_state['checkpoint'] holds the run_id,
+#     the highest page N such that pages 1..N are all in the DB, and the last
+#     notice_id of page N
+#   - `python Scrape.py --resume` continues an unfinished run from there, in
+#     the same run artifacts directory; it re-reads RESUME_OVERLAP_PAGES pages
+#     before N+1 because new notices push older rows down the listing
+RESUME_OVERLAP_PAGES = int(os.getenv("RESUME_OVERLAP_PAGES", "1"))
+
+# FINGERPRINTS:
+#   - FINGERPRINTS=1 (default): rows whose content hash matches the local
+#     index (Fingerprints.py, SQLite at FINGERPRINT_DB) are counted as
+#     unchanged without being sent to Postgres
+#   - the index is rebuilt from notices_stage at the start of every full sweep
+FINGERPRINTS = os.getenv("FINGERPRINTS", "1") == "1"
 
 CREATE_SQL = """
 CREATE TABLE IF NOT EXISTS notices_stage (
@@ -44,33 +123,91 @@ CREATE TABLE IF NOT EXISTS notices_stage (
 );
 """
 
-# Upsert:
+# Per-session staging table for the bulk upsert: rows are COPY'd in and
+# cleared automatically at COMMIT.
+INCOMING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS notices_incoming (
+    ord            INT,
+    page           INT,
+    notice_id      TEXT,
+    title          TEXT,
+    skelbimo_tipas TEXT,
+    publish_date   TIMESTAMP,
+    pdf_urls       TEXT,
+    buyer_name     TEXT
+) ON COMMIT DELETE ROWS;
+"""
+
+# Upsert (one statement for everything in notices_incoming):
 # - Insert new rows
 # - On conflict, UPDATE only if at least one column changed (IS DISTINCT FROM)
-# - RETURNING tells us whether it was an insert or update
+# - A notice_id repeated in the batch is applied once (first occurrence wins)
+# - Returns one status per incoming row: inserted / updated / unchanged /
+#   missing. The outer SELECT sees the table as it was before the INSERT, so a
+#   row not touched by the upsert is 'unchanged' if it already existed and
+#   'missing' otherwise.
 UPSERT_SQL = """
-INSERT INTO notices_stage
-  (notice_id, title, skelbimo_tipas, publish_date, pdf_urls, buyer_name)
-VALUES %s
-ON CONFLICT (notice_id) DO UPDATE SET
-  title          = EXCLUDED.title,
-  skelbimo_tipas = EXCLUDED.skelbimo_tipas,
-  publish_date   = EXCLUDED.publish_date,
-  pdf_urls       = EXCLUDED.pdf_urls,
-  -- only update buyer_name if non-empty
-  buyer_name     = CASE
-                     WHEN NULLIF(EXCLUDED.buyer_name, '') IS NOT NULL
-                     THEN EXCLUDED.buyer_name
-                     ELSE notices_stage.buyer_name
-                   END
-WHERE
-      (EXCLUDED.title          IS DISTINCT FROM notices_stage.title)
-   OR (EXCLUDED.skelbimo_tipas IS DISTINCT FROM notices_stage.skelbimo_tipas)
-   OR (EXCLUDED.publish_date   IS DISTINCT FROM notices_stage.publish_date)
-   OR (EXCLUDED.pdf_urls       IS DISTINCT FROM notices_stage.pdf_urls)
-   OR (NULLIF(EXCLUDED.buyer_name, '') IS NOT NULL
-       AND EXCLUDED.buyer_name IS DISTINCT FROM notices_stage.buyer_name)
-RETURNING notice_id, (xmax = 0) AS inserted, (xmax <> 0) AS updated;
+WITH firsts AS (
+  SELECT DISTINCT ON (notice_id) *
+  FROM notices_incoming
+  ORDER BY notice_id, ord
+),
+up AS (
+  INSERT INTO notices_stage
+    (notice_id, title, skelbimo_tipas, publish_date, pdf_urls, buyer_name)
+  SELECT notice_id, title, skelbimo_tipas, publish_date, pdf_urls, buyer_name
+  FROM firsts
+  ON CONFLICT (notice_id) DO UPDATE SET
+    title          = EXCLUDED.title,
+    skelbimo_tipas = EXCLUDED.skelbimo_tipas,
+    publish_date   = EXCLUDED.publish_date,
+    pdf_urls       = EXCLUDED.pdf_urls,
+    -- only update buyer_name if non-empty
+    buyer_name     = CASE
+                       WHEN NULLIF(EXCLUDED.buyer_name, '') IS NOT NULL
+                       THEN EXCLUDED.buyer_name
+                       ELSE notices_stage.buyer_name
+                     END
+  WHERE
+        (EXCLUDED.title          IS DISTINCT FROM notices_stage.title)
+     OR (EXCLUDED.skelbimo_tipas IS DISTINCT FROM notices_stage.skelbimo_tipas)
+     OR (EXCLUDED.publish_date   IS DISTINCT FROM notices_stage.publish_date)
+     OR (EXCLUDED.pdf_urls       IS DISTINCT FROM notices_stage.pdf_urls)
+     OR (NULLIF(EXCLUDED.buyer_name, '') IS NOT NULL
+         AND EXCLUDED.buyer_name IS DISTINCT FROM notices_stage.buyer_name)
+  RETURNING notice_id, (xmax = 0) AS inserted
+)
+SELECT i.page, i.notice_id,
+       CASE
+         WHEN up.notice_id IS NOT NULL AND f.ord = i.ord
+           THEN CASE WHEN up.inserted THEN 'inserted' ELSE 'updated' END
+         WHEN up.notice_id IS NOT NULL
+           OR EXISTS (SELECT 1 FROM notices_stage s WHERE s.notice_id = i.notice_id)
+           THEN 'unchanged'
+         ELSE 'missing'
+       END AS status
+FROM notices_incoming i
+JOIN firsts f USING (notice_id)
+LEFT JOIN up USING (notice_id)
+ORDER BY i.ord;
+"""
+
+
+# Small key/value store for scraper bookkeeping (last full sweep, ...)
+STATE_SQL = """
+CREATE TABLE IF NOT EXISTS scrape_state (
+    key        TEXT PRIMARY KEY,
+    value      JSONB,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+WATERMARK_SQL = """
+SELECT publish_date, notice_id
+FROM notices_stage
+WHERE publish_date IS NOT NULL
+ORDER BY publish_date DESC, notice_id DESC
+LIMIT 1;
 """
 
 
@@ -119,9 +256,17 @@ def parse_publish_date(text: Optional[str]) -> Optional[datetime]:
 
     return None
 
-def jitter(min_ms: int, max_ms: int) -> int:
-    import random
-    return random.randint(min_ms, max_ms)
+def normalize_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Python-side normalization shared by the browser and the HTTP extractors."""
+    for r in rows:
+        pub_dt = parse_publish_date(r.get("publish_date_text"))
+        r["publish_date"] = pub_dt
+        r.pop("publish_date_text", None)
+    for r in rows:
+        b = (r.get("buyer_name") or "").strip()
+        # Remove (PV) suffix or similar artifacts
+        r["buyer_name"] = re.sub(r"\s*\(PV\)\s*$", "", b, flags=re.IGNORECASE)
+    return rows
 
 # -------------------------------------------------------
 # DB
@@ -142,9 +287,50 @@ def db_connect():
 def db_prepare(conn):
     with conn.cursor() as cur:
         cur.execute(CREATE_SQL)
+        cur.execute(STATE_SQL)
+        cur.execute(INCOMING_SQL)
+    conn.commit()
+
+def db_state_get(conn, key: str) -> Optional[Any]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT value FROM scrape_state WHERE key = %s", (key,))
+        row = cur.fetchone()
     conn.commit()
+    return row[0] if row else None
 
-def db_upsert_rows(conn, rows: List[Dict[str, Any]]):
+def db_state_set(conn, key: str, value: Any):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO scrape_state (key, value, updated_at) VALUES (%s, %s, NOW())
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+            """,
+            (key, Json(value)),
+        )
+    conn.commit()
+
+def db_watermark(conn) -> Optional[Dict[str, Any]]:
+    """High-water mark: newest publish_date (and its notice_id) in notices_stage."""
+    with conn.cursor() as cur:
+        cur.execute(WATERMARK_SQL)
+        row = cur.fetchone()
+    conn.commit()
+    if not row:
+        return None
+    return {"publish_date": row[0], "notice_id": row[1]}
+
+def full_sweep_due(conn) -> bool:
+    if FULL_SWEEP:
+        return True
+    if FULL_SWEEP_EVERY_H <= 0:
+        return False
+    last = db_state_get(conn, "last_full_sweep")
+    if not last:
+        return True
+    age_h = (datetime.now() - datetime.fromisoformat(last)).total_seconds() / 3600.0
+    return age_h >= FULL_SWEEP_EVERY_H
+
+def db_upsert_rows(conn, rows: List[Dict[str, Any]], fp=None):
     """
     Attempts all valid rows. Returns dict with:
     - inserted, updated, unchanged counts
@@ -153,86 +339,108 @@ def db_upsert_rows(conn, rows: List[Dict[str, Any]]):
     - ids_attempted
     - skipped_invalid (rows missing notice_id)
     """
-    if not rows:
-        return {
-            "inserted": 0, "updated": 0, "unchanged": 0,
-            "ids_inserted": [], "ids_updated": [], "ids_unchanged": [],
-            "ids_missing_after_commit": [], "ids_attempted": [],
-            "skipped_invalid": []
-        }
-
-    # Minimal validation: we cannot insert without a primary key
-    valid_rows = []
-    skipped_invalid = []
-    for r in rows:
-        nid = (r.get("notice_id") or "").strip()
-        if not nid:
-            r["_skip_reason"] = "missing_notice_id"
-            skipped_invalid.append(r)
-            continue
-        valid_rows.append(r)
-
-    if not valid_rows:
-        return {
-            "inserted": 0, "updated": 0, "unchanged": 0,
+    return db_upsert_pages(conn, [rows], fp)[0]
+
+def _copy_field(v: Any) -> str:
+    """One value in COPY text format."""
+    if v is None:
+        return "\\N"
+    if isinstance(v, datetime):
+        v = v.isoformat(sep=" ")
+    return (str(v).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def db_upsert_pages(conn, pages: List[List[Dict[str, Any]]], fp=None) -> List[Dict[str, Any]]:
+    """
+    Upsert several pages in ONE transaction: COPY every row into
+    notices_incoming, then a single UPSERT_SQL that returns each row's status.
+    With a fingerprint index `fp`, rows it knows as unchanged are not sent
+    and count as 'unchanged' (also in `unchanged_local`).
+    Returns one db_upsert_rows-style stats dict per page, in order.
+    """
+    results = []
+    buf = io.StringIO()
+    slots = []   # [page_no, notice_id, status] per valid row, in page order
+    sent = []    # (slot, row) of rows sent to Postgres, in COPY order
+    for page_no, rows in enumerate(pages):
+        # Minimal validation: we cannot insert without a primary key
+        skipped_invalid = []
+        valid = []
+        for r in rows or []:
+            nid = (r.get("notice_id") or "").strip()
+            if not nid:
+                r["_skip_reason"] = "missing_notice_id"
+                skipped_invalid.append(r)
+                continue
+            valid.append(r)
+
+        known = Fingerprints.lookup(fp, (r["notice_id"] for r in valid)) if fp is not None else {}
+        n_local = 0
+        for r in valid:
+            slot = [page_no, r["notice_id"], None]
+            slots.append(slot)
+            if Fingerprints.is_unchanged(known.get(r["notice_id"]), r):
+                slot[2] = "unchanged"
+                n_local += 1
+                continue
+            sent.append((slot, r))
+            buf.write("\t".join(_copy_field(v) for v in (
+                len(sent),
+                page_no,
+                r["notice_id"],
+                r["title"],
+                r["skelbimo_tipas"],
+                r["publish_date"],
+                r.get("pdf_urls"),
+                r.get("buyer_name"),
+            )) + "\n")
+
+        results.append({
+            "inserted": 0, "updated": 0, "unchanged": 0, "unchanged_local": n_local,
             "ids_inserted": [], "ids_updated": [], "ids_unchanged": [],
             "ids_missing_after_commit": [], "ids_attempted": [],
             "skipped_invalid": skipped_invalid
-        }
-
-    values = [
-    (
-        r["notice_id"],
-        r["title"],
-        r["skelbimo_tipas"],
-        r["publish_date"],
-        r.get("pdf_urls"),
-        r.get("buyer_name"),       # 👈 add
-    )
-    for r in valid_rows
-]
-    ids_attempted = [r["notice_id"] for r in valid_rows]
-
-    try:
-        with conn.cursor() as cur:
-            # INSERT/UPDATE returning only the rows that actually changed something (insert or update)
-            execute_values(cur, UPSERT_SQL, values, page_size=200)
-            returned = cur.fetchall()  # list of (notice_id, inserted_bool, updated_bool)
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-
-    ids_changed = [rid for (rid, _ins, _upd) in returned]
-    # unchanged = attempted - changed
-    set_attempted = set(ids_attempted)
-    set_changed   = set(ids_changed)
-    ids_unchanged = sorted(set_attempted - set_changed)
-
-    ids_inserted = [rid for (rid, ins, _upd) in returned if ins]
-    ids_updated  = [rid for (rid, ins, upd) in returned if (not ins) and upd]
+        })
 
-    # verify all attempted IDs exist after commit (should be all attempted)
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT notice_id FROM notices_stage WHERE notice_id = ANY(%s)",
-            (ids_attempted,)
-        )
-        present = {row[0] for row in cur.fetchall()}
-
-    ids_missing_after_commit = sorted(set_attempted - present)
-
-    return {
-        "inserted": len(ids_inserted),
-        "updated": len(ids_updated),
-        "unchanged": len(ids_unchanged),
-        "ids_inserted": ids_inserted,
-        "ids_updated": ids_updated,
-        "ids_unchanged": ids_unchanged,
-        "ids_missing_after_commit": ids_missing_after_commit,
-        "ids_attempted": ids_attempted,
-        "skipped_invalid": skipped_invalid,
+    if sent:
+        buf.seek(0)
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert("COPY notices_incoming FROM STDIN", buf)
+                cur.execute(UPSERT_SQL)
+                returned = cur.fetchall()  # list of (page, notice_id, status), in COPY order
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for (slot, _r), (_page, _nid, status) in zip(sent, returned):
+            slot[2] = status
+        if fp is not None:
+            # only the first sent row of a notice_id was written (UPSERT_SQL's
+            # DISTINCT ON ... ORDER BY ord); later duplicates must not be remembered
+            firsts: Dict[str, Any] = {}
+            for slot, r in sent:
+                firsts.setdefault(r["notice_id"], (slot, r))
+            Fingerprints.remember(fp, (r for slot, r in firsts.values() if slot[2] != "missing"))
+
+    key = {
+        "inserted": "ids_inserted",
+        "updated": "ids_updated",
+        "unchanged": "ids_unchanged",
+        "missing": "ids_missing_after_commit",
     }
+    for page_no, nid, status in slots:
+        stats = results[page_no]
+        stats["ids_attempted"].append(nid)
+        stats[key[status]].append(nid)
+    for stats in results:
+        stats["ids_unchanged"].sort()
+        stats["ids_missing_after_commit"].sort()
+        stats["inserted"] = len(stats["ids_inserted"])
+        stats["updated"] = len(stats["ids_updated"])
+        stats["unchanged"] = len(stats["ids_unchanged"])
+
+    return results
 
 # -------------------------------------------------------
 # Scraping
@@ -358,18 +566,24 @@ async def extract_rows_on_page(page) -> List[Dict[str, Any]]:
 """
 )
 
+    return normalize_rows(rows)
 
-    # Python-side normalization
-    for r in rows:
-        pub_dt = parse_publish_date(r.get("publish_date_text"))
-        r["publish_date"] = pub_dt
-        r.pop("publish_date_text", None)
-    for r in rows:
-        b = (r.get("buyer_name") or "").strip()
-        # Remove (PV) suffix or similar artifacts
-        r["buyer_name"] = re.sub(r"\s*\(PV\)\s*$", "", b, flags=re.IGNORECASE)
-
-    return rows
+async def rate_limited(load, url: str = START_URL):
+    """
+    Run one browser page load (`load` returns the goto/click awaitable) under the
+    per-host RateLimit. Replayed HAR sessions are not paced.
+    """
+    if HTTP_ARCHIVE != "replay":
+        await RateLimit.wait_async(url)
+    t0 = time.monotonic()
+    try:
+        resp = await load()
+    except PWTimeout:
+        RateLimit.report(url, time.monotonic() - t0, error=True)
+        raise
+    # page.goto returns a Response (with .status); a click gathers to a list
+    RateLimit.report(url, time.monotonic() - t0, status=getattr(resp, "status", None))
+    return resp
 
 async def click_next(page) -> bool:
     # 1) explicit Kitas/Next
@@ -390,10 +604,10 @@ async def click_next(page) -> bool:
             if not await loc.is_enabled():
                 return False
             try:
-                await asyncio.gather(
+                await rate_limited(lambda: asyncio.gather(
                     page.wait_for_load_state("domcontentloaded"),
                     loc.click(),
-                )
+                ))
             except PWTimeout:
                 return False
             await asyncio.sleep(0.5)
@@ -407,10 +621,10 @@ async def click_next(page) -> bool:
             if not await pager_right.is_enabled():
                 return False
             try:
-                await asyncio.gather(
+                await rate_limited(lambda: asyncio.gather(
                     page.wait_for_load_state("domcontentloaded"),
                     pager_right.click(),
-                )
+                ))
             except PWTimeout:
                 return False
             await asyncio.sleep(0.5)
@@ -423,10 +637,10 @@ async def click_next(page) -> bool:
             if not await loc.is_enabled():
                 return False
             try:
-                await asyncio.gather(
+                await rate_limited(lambda: asyncio.gather(
                     page.wait_for_load_state("domcontentloaded"),
                     loc.click(),
-                )
+                ))
             except PWTimeout:
                 return False
             await asyncio.sleep(0.5)
@@ -434,6 +648,62 @@ async def click_next(page) -> bool:
 
     return False
 
+async def next_page_href(page) -> Optional[str]:
+    """Absolute href of the enabled 'Kitas'/'Next' pager link, or None."""
+    for sel in ['a[title="Kitas"]', "a:has-text('Kitas')", "a:has-text('Next')"]:
+        loc = page.locator(sel).first
+        if not await loc.count():
+            continue
+        if (await loc.get_attribute("disabled")) is not None:
+            return None
+        if (await loc.get_attribute("aria-disabled")) == "true":
+            return None
+        href = (await loc.get_attribute("href") or "").strip()
+        if href and not href.lower().startswith(("javascript:", "#")):
+            return urljoin(page.url, href)
+        return None
+    return None
+
+async def new_browser_context(browser):
+    """Browser context with our UA/viewport, recording or replaying HTTP_ARCHIVE if set."""
+    kwargs: Dict[str, Any] = {}
+    if HTTP_ARCHIVE == "record":
+        os.makedirs(os.path.dirname(HTTP_ARCHIVE_PATH) or ".", exist_ok=True)
+        kwargs["record_har_path"] = HTTP_ARCHIVE_PATH
+    ctx = await browser.new_context(
+        user_agent=USER_AGENT,
+        viewport={"width": 1366, "height": 900},
+        **kwargs,
+    )
+    if HTTP_ARCHIVE == "replay":
+        await ctx.route_from_har(HTTP_ARCHIVE_PATH, not_found="abort")
+    return ctx
+
+async def open_listing(ctx):
+    """New page on START_URL with the cookie banner dismissed and 100 rows per page."""
+    page = await ctx.new_page()
+    page.set_default_timeout(15000)
+    page.set_default_navigation_timeout(30000)
+
+    await rate_limited(lambda: page.goto(START_URL, wait_until="domcontentloaded"))
+
+    # cookie banner (best effort)
+    try:
+        for sel in [
+            "button:has-text('Sutinku')",
+            "button:has-text('Accept')",
+            "button#onetrust-accept-btn-handler",
+        ]:
+            btn = page.locator(sel).first
+            if await btn.count():
+                await btn.click()
+                break
+    except Exception:
+        pass
+
+    await set_per_page_100(page)
+    return page
+
 async def extract_pdf_links(browser_context, url: str) -> List[str]:
     """Extract any .pdf links from a detail page (debug only, not stored)."""
     pdfs: List[str] = []
@@ -441,7 +711,7 @@ async def extract_pdf_links(browser_context, url: str) -> List[str]:
         return pdfs
     page = await browser_context.new_page()
     try:
-        await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+        await rate_limited(lambda: page.goto(url, wait_until="domcontentloaded", timeout=15000), url)
         anchors = page.locator("a[href$='.pdf'], a[href*='.pdf?']")
         if await anchors.count():
             hrefs = await anchors.evaluate_all("els => els.map(e => e.href)")
@@ -457,147 +727,801 @@ async def extract_pdf_links(browser_context, url: str) -> List[str]:
     return pdfs
 
 # -------------------------------------------------------
-# Main
+# Scraping (plain HTTP, no browser)
 # -------------------------------------------------------
 
-async def main():
-    conn = db_connect()
-    db_prepare(conn)
+ID_LABELS    = ["Pranešimo ID", "Notice ID"]
+TYPE_LABELS  = ["Pranešimo tipas", "Notice type"]
+TITLE_LABELS = ["Pranešimo pavadinimas", "Notice title"]
+DATE_LABELS  = ["Paskelbimo data", "Publish date"]
+BUYER_LABELS = [
+    "Perkančioji organizacija",
+    "Perkančiosios organizacijos pavadinimas",
+    "Perkančioji organizacija (pv)",
+    "Perkančiosios organizacijos pavadinimas (pv)",
+    "Buyer",
+    "Contracting authority",
+    "PV",
+]
+NEXT_TEXTS = ("Kitas", "Next", "›", "»")
+PDF_HREF_RE = re.compile(r"\.pdf(\?|$)", re.IGNORECASE)
+
+
+def http_session() -> requests.Session:
+    """Pooled keep-alive session used for the listing pages."""
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(8, SHARDS),
+        max_retries=Retry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET",),
+        ),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
+        "Accept-Language": "lt,lt-LT;q=0.9,en;q=0.8",
+    })
+    return s
+
+def _norm_text(s: Optional[str]) -> str:
+    return " ".join((s or "").replace("\xa0", " ").split())
+
+def _td_by_col(tds, labels: List[str], fallback_idx: Optional[int] = None):
+    # same rule as byCol() in extract_rows_on_page: data-column equals/starts with label,
+    # else the positional fallback (tds[1], tds[2], ...) if the row has that many cells
+    for td in tds:
+        col = td.get("data-column")
+        if col is None:
+            continue
+        v = _norm_text(col).lower()
+        for lbl in labels:
+            k = _norm_text(lbl).lower()
+            if v == k or v.startswith(k):
+                return td
+    if fallback_idx is not None and fallback_idx < len(tds):
+        return tds[fallback_idx]
+    return None
 
-    all_rows: List[Dict[str, Any]] = []
-    report_pages = []   # per-page insert/update/unchanged stats
-    attempt_rows = []   # flat list for CSV: page, notice_id, status
-    skipped_all = []    # rows skipped due to missing PK (should be rare)
+def _td_text(td) -> str:
+    return _norm_text(td.text_content()) if td is not None else ""
 
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            ctx = await browser.new_context(
-                user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"),
-                viewport={"width": 1366, "height": 900},
+def parse_listing_doc(doc) -> List[Dict[str, Any]]:
+    """
+    lxml port of the JS evaluator in extract_rows_on_page.
+    `doc` must already have absolute links (like a.href in the browser).
+    Returns the same raw records (before normalize_rows).
+    """
+    out: List[Dict[str, Any]] = []
+    for table in doc.iter("table"):
+        headers = [
+            _norm_text(th.text_content()).lower()
+            for th in table.xpath(".//thead//th | .//thead//td")
+        ]
+        pv_idx = headers.index("pv") if "pv" in headers else -1
+        if pv_idx < 0:
+            pv_idx = next(
+                (i for i, h in enumerate(headers)
+                 if "perkančioji organizacija" in h or "perkančiosios organizacijos" in h),
+                -1,
             )
-            page = await ctx.new_page()
-            page.set_default_timeout(15000)
-            page.set_default_navigation_timeout(30000)
 
-            await page.goto(START_URL, wait_until="domcontentloaded")
+        # libxml2 does not insert an implicit <tbody> like browsers do
+        body_rows = table.xpath(".//tbody//tr") or table.xpath("./tr[td]")
+        for tr in body_rows:
+            tds = tr.xpath(".//td")
+            if not tds:
+                continue
+
+            # lxml elements are falsy when childless, so no `or` chains here
+            id_td    = _td_by_col(tds, ID_LABELS, fallback_idx=1)
+            type_td  = _td_by_col(tds, TYPE_LABELS, fallback_idx=2)
+            title_td = _td_by_col(tds, TITLE_LABELS, fallback_idx=3)
+
+            buyer_td = tds[pv_idx] if 0 <= pv_idx < len(tds) else None
+            if buyer_td is None:
+                buyer_td = _td_by_col(tds, BUYER_LABELS)
+
+            date_td = _td_by_col(tds, DATE_LABELS)
+            if date_td is None:
+                date_td = tds[-1]
+
+            anchors = tr.xpath(".//a")
+            detail_a = next(
+                (a for a in anchors if not PDF_HREF_RE.search(a.get("href") or "")),
+                anchors[0] if anchors else None,
+            )
+            detail_href = (detail_a.get("href") or "") if detail_a is not None else None
+
+            rec = {
+                "notice_id": _td_text(id_td),
+                "title": _td_text(title_td),
+                "skelbimo_tipas": _td_text(type_td),
+                "buyer_name": re.sub(r"\s*\(PV\)\s*$", "", _td_text(buyer_td), flags=re.IGNORECASE),
+                "publish_date_text": _td_text(date_td),
+                "pdf_urls": detail_href,
+                "_detail_url": detail_href,
+            }
+            out.append(rec)
+    return out
+
+def find_next_href(doc) -> Optional[str]:
+    """href of the 'Kitas'/'Next'/›/» pager link, or None on the last page."""
+    candidates = doc.xpath("//a[@title='Kitas']")
+    for label in NEXT_TEXTS:
+        candidates += [a for a in doc.iter("a") if label in _norm_text(a.text_content())]
+    for a in candidates:
+        href = (a.get("href") or "").strip()
+        if href.lower().startswith(("http://", "https://")):
+            return href
+    return None
 
-            # cookie banner (best effort)
+def with_query(url: str, **params: str) -> str:
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query.update(params)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def per_page_100_url(doc, url: str) -> Optional[str]:
+    """HTTP equivalent of set_per_page_100: the listing URL with the page-size select set to 100."""
+    for sel in doc.iter("select"):
+        name = sel.get("name")
+        if not name:
+            continue
+        for opt in sel.iter("option"):
+            if opt.text_content().strip() == "100":
+                return with_query(url, **{name: opt.get("value") or "100"})
+    return None
+
+def looks_like_listing(rows: List[Dict[str, Any]]) -> bool:
+    """True if the parsed rows have the shape we know (numeric notice IDs)."""
+    return any(re.fullmatch(r"\d+", r.get("notice_id") or "") for r in rows)
+
+def fetch_listing_http(session: requests.Session, url: str):
+    """GET one listing page. Returns (raw rows, next page URL, lxml doc, final URL)."""
+    RateLimit.wait(url)
+    t0 = time.monotonic()
+    try:
+        resp = session.get(url, timeout=HTTP_TIMEOUT)
+    except requests.RequestException:
+        RateLimit.report(url, time.monotonic() - t0, error=True)
+        raise
+    RateLimit.report(url, time.monotonic() - t0, status=resp.status_code,
+                     retry_after=RateLimit.retry_after_seconds(resp.headers))
+    resp.raise_for_status()
+    doc = lxml.html.fromstring(resp.text)
+    doc.make_links_absolute(resp.url, handle_failures="ignore")
+    return parse_listing_doc(doc), find_next_href(doc), doc, resp.url
+
+# -------------------------------------------------------
+# Sharded pagination
+# -------------------------------------------------------
+
+def page_url_template(next_href: Optional[str], next_page_no: int = 2):
+    """
+    Find the query parameter carrying the page number in a pager link
+    (displaytag uses 'd-<tableid>-p'). Returns (href, param) or None.
+    """
+    if not next_href:
+        return None
+    params = parse_qsl(urlsplit(next_href).query, keep_blank_values=True)
+    for k, v in params:
+        if re.fullmatch(r"d-\d+-p", k) and v == str(next_page_no):
+            return (next_href, k)
+    for k, v in params:
+        if v == str(next_page_no):
+            return (next_href, k)
+    return None
+
+def page_url(template, page_no: int) -> str:
+    href, param = template
+    return with_query(href, **{param: str(page_no)})
+
+def dedupe_rows(rows: List[Dict[str, Any]], seen: set) -> List[Dict[str, Any]]:
+    """Drop rows whose notice_id another shard already recorded (listing shifts mid-run)."""
+    out = []
+    for r in rows:
+        nid = (r.get("notice_id") or "").strip()
+        if nid:
+            if nid in seen:
+                continue
+            seen.add(nid)
+        out.append(r)
+    return out
+
+async def scrape_shard(shard: int, fetch, conn, run: Dict[str, Any], state: Dict[str, Any]):
+    """
+    Worker for one shard. `fetch(page_no)` returns (rows, has_next); rows is
+    None if the page HTML was not recognised.
+    """
+    page_idx = state["first_page"] + shard
+    while True:
+        if PAGE_LIMIT > 0 and page_idx > PAGE_LIMIT:
+            break
+        if state["last_page"] is not None and page_idx > state["last_page"]:
+            break
+
+        async with state["sem"]:
+            print(f"Scraping page {page_idx} (shard {shard})…")
             try:
-                for sel in [
-                    "button:has-text('Sutinku')",
-                    "button:has-text('Accept')",
-                    "button#onetrust-accept-btn-handler",
-                ]:
-                    btn = page.locator(sel).first
-                    if await btn.count():
-                        await btn.click()
-                        break
-            except Exception:
-                pass
-
-            await set_per_page_100(page)
-
-            page_idx = 1
-            while True:
-                print(f"Scraping page {page_idx}…")
+                rows, has_next = await fetch(page_idx)
+            except Exception as e:
+                print(f"Shard {shard}: page {page_idx} failed: {repr(e)}")
+                rows, has_next = None, True
+
+        if rows is None:
+            state["failed"].append(page_idx)
+            break
+        if state["last_page"] is not None and page_idx > state["last_page"]:
+            break  # another shard found the end while we were loading
+        if not rows:
+            state["last_page"] = min(state["last_page"] or page_idx, page_idx - 1)
+            break
+        if not has_next:
+            state["last_page"] = min(state["last_page"] or page_idx, page_idx)
+
+        stop_at = await submit_page(conn, run, page_idx, dedupe_rows(rows, state["seen"]))
+        if stop_at is not None and (state["last_page"] is None or stop_at < state["last_page"]):
+            print(f"Incremental: pages up to {stop_at} unchanged. Stopping shards.")
+            state["last_page"] = min(state["last_page"] or stop_at, stop_at)
+
+        page_idx += SHARDS
+
+async def run_shards(fetchers: List[Any], conn, run: Dict[str, Any],
+                     first_page: int = 1) -> Optional[int]:
+    """
+    Run one scrape_shard per fetcher, starting at `first_page`. Returns None
+    when every page up to the end was handled, otherwise the first page that
+    could not be parsed.
+    """
+    state: Dict[str, Any] = {
+        "first_page": first_page,
+        "sem": asyncio.Semaphore(SHARD_CONCURRENCY),
+        "last_page": None,
+        "seen": set(),
+        "failed": [],
+    }
+    await asyncio.gather(*(
+        scrape_shard(k, fetch, conn, run, state) for k, fetch in enumerate(fetchers)
+    ))
+    failed = [n for n in state["failed"]
+              if state["last_page"] is None or n <= state["last_page"]]
+    print(f"Shards done (last_page={state['last_page']}, failed_pages={sorted(failed)}).")
+    return min(failed) if failed else None
+
+async def scrape_browser_sharded(conn, run: Dict[str, Any], start_page: int = 1) -> Optional[int]:
+    """
+    SHARDS browser contexts, each loading its own pages directly by URL.
+    Returns like run_shards, or `start_page` if the pager URL could not be derived.
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        contexts, pages = [], []
+        for _ in range(SHARDS):
+            ctx = await new_browser_context(browser)
+            contexts.append(ctx)
+            pages.append(await open_listing(ctx))
+
+        template = page_url_template(await next_page_href(pages[0]), 2)
+        if not template:
+            print("Sharded: could not derive page URLs from the pager; using sequential mode.")
+            for ctx in contexts:
+                await ctx.close()
+            await browser.close()
+            return start_page
+
+        def make_fetch(page):
+            async def fetch(page_no: int):
+                await rate_limited(lambda: page.goto(page_url(template, page_no), wait_until="domcontentloaded"))
                 rows = await extract_rows_on_page(page)
-                if not rows:
-                    print("No rows found; stopping.")
-                    break
-
-                # Optional: use the detail link (now in pdf_urls) to collect PDFs for debugging
-                if EXTRACT_PDFS:
-                    sem = asyncio.Semaphore(PDF_CONCURRENCY)
-                    async def fetch_from_detail(r):
-                        async with sem:
-                            extras = await extract_pdf_links(ctx, r.get("_detail_url") or "")
-                            r["__pdfs_found"] = extras  # debug only
-                        return r
-                    rows = await asyncio.gather(*(fetch_from_detail(r) for r in rows))
-
-                # Strip helper key before DB/backup
-                for r in rows:
-                    r.pop("_detail_url", None)
-
-                # DB upsert per page (so progress is saved)
-                try:
-                    stats = db_upsert_rows(conn, rows)
-                    # Record per-page stats
-                    report_pages.append({
-                        "page": page_idx,
-                        "inserted": stats["inserted"],
-                        "updated": stats["updated"],
-                        "unchanged": stats["unchanged"],
-                        "ids_missing_after_commit": stats["ids_missing_after_commit"],
-                        "skipped_invalid_count": len(stats["skipped_invalid"]),
-                    })
-                    skipped_all.extend(stats["skipped_invalid"])
-
-                    # Build a flat attempt log for CSV
-                    set_ins  = set(stats["ids_inserted"])
-                    set_upd  = set(stats["ids_updated"])
-                    set_unch = set(stats["ids_unchanged"])
-                    set_miss = set(stats["ids_missing_after_commit"])
-                    for nid in stats["ids_attempted"]:
-                        if nid in set_ins:
-                            status = "inserted"
-                        elif nid in set_upd:
-                            status = "updated"
-                        elif nid in set_unch:
-                            status = "unchanged"
-                        elif nid in set_miss:
-                            status = "missing_after_commit"
-                        else:
-                            status = "unknown"  # shouldn’t happen
-                        attempt_rows.append({"page": page_idx, "notice_id": nid, "status": status})
-
-                    print(
-                        f"DB page {page_idx} — inserted={stats['inserted']}, "
-                        f"updated={stats['updated']}, unchanged={stats['unchanged']}, "
-                        f"missing_after_commit={len(stats['ids_missing_after_commit'])}, "
-                        f"skipped_invalid={len(stats['skipped_invalid'])}"
-                    )
-                except Exception as e:
-                    print(f"DB UPSERT FAILED on page {page_idx}: {repr(e)}")
-
-                all_rows.extend(rows)
-
-                # page cap (only applies if PAGE_LIMIT > 0)
-                if PAGE_LIMIT > 0 and page_idx >= PAGE_LIMIT:
-                    print(f"Reached PAGE_LIMIT={PAGE_LIMIT}. Stopping.")
-                    break
-
-                moved = await click_next(page)
-                if not moved:
-                    print("Reached last page.")
-                    break
-
-                page_idx += 1
-                await asyncio.sleep(jitter(*PER_REQUEST_WAIT_MS) / 1000.0)
-
-            await ctx.close()
+                return rows, (await next_page_href(page)) is not None
+            return fetch
+
+        try:
+            return await run_shards([make_fetch(pg) for pg in pages], conn, run, start_page)
+        finally:
+            for ctx in contexts:
+                await ctx.close()
             await browser.close()
 
+# -------------------------------------------------------
+# Offline replay benchmark
+# -------------------------------------------------------
+
+def har_listing_entries(har_path: str) -> List[Dict[str, Any]]:
+    """
+    Listing responses (quickSearchAction.do, HTML) in a recorded HAR / HAR zip.
+    Returns [{"url", "method", "html"}].
+    """
+    if har_path.endswith(".zip"):
+        with zipfile.ZipFile(har_path) as zf:
+            har_name = next(n for n in zf.namelist() if n.endswith(".har"))
+            return _har_entries(json.loads(zf.read(har_name)), zf.read)
+    with open(har_path, encoding="utf-8") as f:
+        return _har_entries(json.load(f), None)
+
+def _har_entries(har: Dict[str, Any], read_file) -> List[Dict[str, Any]]:
+    out = []
+    for e in har.get("log", {}).get("entries", []):
+        req, resp = e.get("request", {}), e.get("response", {})
+        content = resp.get("content", {})
+        if "quickSearchAction.do" not in req.get("url", ""):
+            continue
+        if "html" not in (content.get("mimeType") or "") or resp.get("status") != 200:
+            continue
+        if content.get("_file") and read_file:
+            body = read_file(content["_file"])
+        elif content.get("encoding") == "base64":
+            body = base64.b64decode(content.get("text") or "")
+        else:
+            body = (content.get("text") or "").encode("utf-8")
+        out.append({"url": req["url"], "method": req.get("method", "GET"),
+                    "html": body.decode("utf-8", errors="replace")})
+    return out
+
+async def bench_replay(repeat: int = 5):
+    """
+    Parse every archived listing page `repeat` times with the lxml parser and
+    with the JS evaluator (pages served from the HAR, no network), print
+    throughput and any row differences between the two.
+    """
+    entries = har_listing_entries(HTTP_ARCHIVE_PATH)
+    if not entries:
+        print(f"No listing pages in {HTTP_ARCHIVE_PATH}.")
+        return
+    print(f"{len(entries)} archived listing responses in {HTTP_ARCHIVE_PATH}")
+
+    t0 = time.perf_counter()
+    lxml_rows = []
+    for _ in range(repeat):
+        lxml_rows = []
+        for e in entries:
+            doc = lxml.html.fromstring(e["html"])
+            doc.make_links_absolute(e["url"], handle_failures="ignore")
+            lxml_rows.append(normalize_rows(parse_listing_doc(doc)))
+    dt = time.perf_counter() - t0
+    n_pages = len(entries) * repeat
+    print(f"lxml: {n_pages / dt:.1f} pages/s, {1000 * dt / n_pages:.2f} ms/page, "
+          f"{sum(map(len, lxml_rows))} rows/pass")
+
+    get_entries = [(i, e) for i, e in enumerate(entries) if e["method"] == "GET"]
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        ctx = await browser.new_context(user_agent=USER_AGENT, viewport={"width": 1366, "height": 900})
+        await ctx.route_from_har(HTTP_ARCHIVE_PATH, not_found="abort")
+        page = await ctx.new_page()
+        load_t = eval_t = 0.0
+        diffs = 0
+        for i, e in get_entries:
+            t0 = time.perf_counter()
+            await page.goto(e["url"], wait_until="domcontentloaded")
+            load_t += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                js_rows = await extract_rows_on_page(page)
+            eval_t += time.perf_counter() - t0
+            for r in js_rows:
+                r.pop("_detail_url", None)
+            ref = [{k: v for k, v in r.items() if k != "_detail_url"} for r in lxml_rows[i]]
+            if js_rows != ref:
+                diffs += 1
+                print(f"  rows differ on {e['url']}")
+        await ctx.close()
+        await browser.close()
+
+    if get_entries:
+        n_eval = len(get_entries) * repeat
+        print(f"js evaluator: {n_eval / eval_t:.1f} pages/s, {1000 * eval_t / n_eval:.2f} ms/page "
+              f"(+{1000 * load_t / len(get_entries):.1f} ms/page replayed load)")
+        print(f"lxml vs js: {len(get_entries) - diffs}/{len(get_entries)} pages identical")
+    else:
+        print("No GET listing responses to replay in the browser (POST navigations only).")
+
+# -------------------------------------------------------
+# Main
+# -------------------------------------------------------
+
+def record_stats(run: Dict[str, Any], page_idx: int, rows: List[Dict[str, Any]],
+                 stats: Optional[Dict[str, Any]]):
+    """Append one page's upsert stats (None = upsert failed) to the run report."""
+    if stats is not None:
+        ids = stats["ids_attempted"]
+        run["committed"][page_idx] = ids[-1] if ids else None
+
+        # Record per-page stats
+        run["pages"].append({
+            "page": page_idx,
+            "inserted": stats["inserted"],
+            "updated": stats["updated"],
+            "unchanged": stats["unchanged"],
+            "ids_missing_after_commit": stats["ids_missing_after_commit"],
+            "skipped_invalid_count": len(stats["skipped_invalid"]),
+        })
+        run["unchanged_local"][page_idx] = stats["unchanged_local"]
+        RunArtifacts.append(run["artifacts"], "skipped_invalid", stats["skipped_invalid"])
+
+        # Build a flat attempt log (NDJSON; `RunArtifacts.py --csv` for a spreadsheet)
+        attempts = []
+        set_ins  = set(stats["ids_inserted"])
+        set_upd  = set(stats["ids_updated"])
+        set_unch = set(stats["ids_unchanged"])
+        set_miss = set(stats["ids_missing_after_commit"])
+        for nid in stats["ids_attempted"]:
+            if nid in set_ins:
+                status = "inserted"
+            elif nid in set_upd:
+                status = "updated"
+            elif nid in set_unch:
+                status = "unchanged"
+            elif nid in set_miss:
+                status = "missing_after_commit"
+            else:
+                status = "unknown"  # shouldn’t happen
+            attempts.append({"page": page_idx, "notice_id": nid, "status": status})
+        RunArtifacts.append(run["artifacts"], "attempts", attempts)
+
+        print(
+            f"DB page {page_idx} — inserted={stats['inserted']}, "
+            f"updated={stats['updated']}, unchanged={stats['unchanged']} "
+            f"({stats['unchanged_local']} not sent), "
+            f"missing_after_commit={len(stats['ids_missing_after_commit'])}, "
+            f"skipped_invalid={len(stats['skipped_invalid'])}"
+        )
+
+    RunArtifacts.append(run["artifacts"], "notices", rows)
+
+    stop_at = incremental_stop(run, page_idx, rows, stats)
+    if stop_at is not None:
+        run["stop_at"] = min(run.get("stop_at") or stop_at, stop_at)
+
+def save_checkpoint(conn, run: Dict[str, Any]):
+    """
+    Advance the checkpoint over pages committed contiguously after it (shards
+    and failed upserts leave gaps) and persist it if it moved.
+    """
+    ck = run["checkpoint"]
+    moved = False
+    while ck["page"] + 1 in run["committed"]:
+        ck["page"] += 1
+        ck["notice_id"] = run["committed"].pop(ck["page"]) or ck["notice_id"]
+        moved = True
+    if moved:
+        try:
+            db_state_set(conn, "checkpoint", ck)
+        except Exception as e:
+            conn.rollback()
+            print(f"Checkpoint save failed at page {ck['page']}: {repr(e)}")
+
+async def submit_page(conn, run: Dict[str, Any], page_idx: int, rows: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Hand one scraped page to the DB. With DB_WRITER the page goes to the
+    bounded writer queue (waits while the writer is behind); otherwise it is
+    upserted inline. Returns the page at which incremental mode says to
+    stop, once known.
+    """
+    # Strip helper key before DB/backup
+    for r in rows:
+        r.pop("_detail_url", None)
+
+    if "queue" in run:
+        await queue_page(run, (page_idx, rows))
+    else:
+        # DB upsert per page (so progress is saved)
+        try:
+            stats = db_upsert_rows(conn, rows, run.get("fp"))
+        except Exception as e:
+            print(f"DB UPSERT FAILED on page {page_idx}: {repr(e)}")
+            stats = None
+        record_stats(run, page_idx, rows, stats)
+        save_checkpoint(conn, run)
+    return run.get("stop_at")
+
+async def queue_page(run: Dict[str, Any], item):
+    """
+    Put `item` on the writer queue. If the writer task has died, its
+    exception is raised here instead of waiting forever on a full queue.
+    """
+    writer = run["writer"]
+    if not writer.done():
+        put = asyncio.ensure_future(run["queue"].put(item))
+        await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+        if put.done():
+            return
+        put.cancel()
+    writer.result()
+    raise RuntimeError("DB writer stopped before the end of the run")
+
+async def db_writer(conn, run: Dict[str, Any]):
+    """
+    Consumer side of the page queue. Drains whatever pages are waiting (up to
+    WRITER_BATCH_PAGES), upserts them in one transaction on a worker thread so
+    the event loop keeps scraping, then records their stats. Stops on None.
+    """
+    queue = run["queue"]
+    done = False
+    while not done:
+        item = await queue.get()
+        if item is None:
+            break
+        batch = [item]
+        while len(batch) < WRITER_BATCH_PAGES and not queue.empty():
+            item = queue.get_nowait()
+            if item is None:
+                done = True
+                break
+            batch.append(item)
+
+        try:
+            results = await asyncio.to_thread(
+                db_upsert_pages, conn, [rows for _p, rows in batch], run.get("fp")
+            )
+        except Exception as e:
+            print(f"DB UPSERT FAILED on pages {[p for p, _rows in batch]}: {repr(e)}")
+            results = [None] * len(batch)
+        for (page_idx, rows), stats in zip(batch, results):
+            record_stats(run, page_idx, rows, stats)
+        save_checkpoint(conn, run)
+
+def incremental_stop(run: Dict[str, Any], page_idx: int,
+                     rows: List[Dict[str, Any]], stats: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    Mark the page stale if it held only known, unchanged notices at or below
+    the watermark. Returns the page index that completes a window of
+    INCREMENTAL_STOP_PAGES consecutive stale pages (scraping can stop there),
+    else None. Works for out-of-order (sharded) pages too.
+    """
+    inc = run.get("incremental")
+    if not inc or not stats:
+        return None
+    wm = inc["watermark"]["publish_date"]
+    stale = (
+        stats["inserted"] == 0
+        and stats["updated"] == 0
+        and not stats["ids_missing_after_commit"]
+        and not stats["skipped_invalid"]
+        and stats["unchanged"] > 0
+        and all(r.get("publish_date") is None or r["publish_date"] <= wm for r in rows)
+    )
+    if not stale:
+        return None
+    inc["stale"].add(page_idx)
+    k = inc["k"]
+    for end in range(page_idx, page_idx + k):
+        if all(p in inc["stale"] for p in range(end - k + 1, end + 1)):
+            return end
+    return None
+
+async def scrape_http(conn, run: Dict[str, Any], start_page: int = 1) -> Optional[int]:
+    """
+    Walk the listing with plain HTTP requests from `start_page` on.
+    Returns None when done (last page or PAGE_LIMIT), otherwise the page
+    index the Playwright path should continue from (HTML not recognised).
+    """
+    session = http_session()
+    # a failure before the listing reaches start_page resumes there, not on page 1
+    page_idx = start_page
+    try:
+        rows, next_url, doc, url = await asyncio.to_thread(fetch_listing_http, session, START_URL)
+        url_100 = per_page_100_url(doc, url)
+        if url_100:
+            rows, next_url, doc, url = await asyncio.to_thread(fetch_listing_http, session, url_100)
+
+        template = page_url_template(next_url, 2)
+        if start_page > 1 and not (template and looks_like_listing(rows)):
+            print(f"HTTP: cannot jump to page {start_page}; continuing in the browser.")
+            return start_page
+        if SHARDS > 1 and template and looks_like_listing(rows):
+            async def fetch(page_no: int):
+                rows, next_url, _doc, _url = await asyncio.to_thread(
+                    fetch_listing_http, session, page_url(template, page_no)
+                )
+                if not looks_like_listing(rows):
+                    return None, False
+                return normalize_rows(rows), next_url is not None
+            return await run_shards([fetch] * SHARDS, conn, run, start_page)
+
+        if start_page > 1:
+            rows, next_url, doc, url = await asyncio.to_thread(
+                fetch_listing_http, session, page_url(template, start_page)
+            )
+
+        while True:
+            if not looks_like_listing(rows):
+                print(f"HTTP: listing HTML not recognised on page {page_idx}; falling back to browser.")
+                return page_idx
+
+            print(f"Scraping page {page_idx} (http)…")
+            stop_at = await submit_page(conn, run, page_idx, normalize_rows(rows))
+            if stop_at is not None and page_idx >= stop_at:
+                print(f"Incremental: {INCREMENTAL_STOP_PAGES} consecutive unchanged pages. Stopping.")
+                return None
+
+            # page cap (only applies if PAGE_LIMIT > 0)
+            if PAGE_LIMIT > 0 and page_idx >= PAGE_LIMIT:
+                print(f"Reached PAGE_LIMIT={PAGE_LIMIT}. Stopping.")
+                return None
+            if not next_url:
+                print("Reached last page.")
+                return None
+
+            page_idx += 1
+            rows, next_url, doc, url = await asyncio.to_thread(fetch_listing_http, session, next_url)
+    except Exception as e:
+        print(f"HTTP: page {page_idx} failed ({repr(e)}); falling back to browser.")
+        return page_idx
+    finally:
+        session.close()
+
+async def scrape_browser(conn, run: Dict[str, Any], start_page: int = 1):
+    """
+    Playwright path. Jumps to `start_page` by pager URL when it can be
+    derived, otherwise pages before it are only clicked through.
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        ctx = await new_browser_context(browser)
+        page = await open_listing(ctx)
+
+        page_idx = 1
+        template = page_url_template(await next_page_href(page), 2) if start_page > 1 else None
+        if template:
+            await rate_limited(lambda: page.goto(page_url(template, start_page), wait_until="domcontentloaded"))
+            page_idx = start_page
+        while page_idx < start_page:
+            if not await click_next(page):
+                print(f"Could not reach page {start_page}; stopping.")
+                break
+            page_idx += 1
+
+        while page_idx >= start_page:
+            print(f"Scraping page {page_idx}…")
+            rows = await extract_rows_on_page(page)
+            if not rows:
+                print("No rows found; stopping.")
+                break
+
+            # Optional: use the detail link (now in pdf_urls) to collect PDFs for debugging
+            if EXTRACT_PDFS:
+                sem = asyncio.Semaphore(PDF_CONCURRENCY)
+                async def fetch_from_detail(r):
+                    async with sem:
+                        extras = await extract_pdf_links(ctx, r.get("_detail_url") or "")
+                        r["__pdfs_found"] = extras  # debug only
+                    return r
+                rows = await asyncio.gather(*(fetch_from_detail(r) for r in rows))
+
+            stop_at = await submit_page(conn, run, page_idx, rows)
+            if stop_at is not None and page_idx >= stop_at:
+                print(f"Incremental: {INCREMENTAL_STOP_PAGES} consecutive unchanged pages. Stopping.")
+                break
+
+            # page cap (only applies if PAGE_LIMIT > 0)
+            if PAGE_LIMIT > 0 and page_idx >= PAGE_LIMIT:
+                print(f"Reached PAGE_LIMIT={PAGE_LIMIT}. Stopping.")
+                break
+
+            moved = await click_next(page)
+            if not moved:
+                print("Reached last page.")
+                break
+
+            page_idx += 1
+
+        await ctx.close()
+        await browser.close()
+
+async def main(resume: bool = False):
+    conn = db_connect()
+    db_prepare(conn)
+
+    ck = db_state_get(conn, "checkpoint")
+    if not (ck and ck.get("status") == "running"):
+        ck = None
+    if resume and not ck:
+        print("--resume: no unfinished run to resume; starting from page 1.")
+    elif ck and not resume:
+        print(f"Run {ck['run_id']} stopped after page {ck['page']}; `--resume` would continue it.")
+    resume_ck = ck if resume else None
+    start_page = max(1, resume_ck["page"] + 1 - RESUME_OVERLAP_PAGES) if resume_ck else 1
+
+    # rows, attempt statuses and skipped-invalid rows are streamed to
+    # ARTIFACTS_DIR/<run_id>/*.ndjson as pages complete; only the small
+    # per-page stats stay in memory
+    run: Dict[str, Any] = {
+        "pages": [],      # per-page insert/update/unchanged stats
+        "unchanged_local": {},  # page -> rows the fingerprint index kept from Postgres
+        "committed": {},  # page -> last notice_id, until the checkpoint moves past it
+        "artifacts": RunArtifacts.start_run(run_id=resume_ck["run_id"] if resume_ck else None),
+    }
+    print(f"Run artifacts: {run['artifacts']['dir']}")
+    if resume_ck:
+        print(f"Resuming run {resume_ck['run_id']} from page {start_page} "
+              f"(checkpoint: page {resume_ck['page']}, notice_id={resume_ck['notice_id']}).")
+
+    if resume_ck:
+        full_sweep = resume_ck["full_sweep"]
+    else:
+        full_sweep = INCREMENTAL_STOP_PAGES <= 0 or full_sweep_due(conn)
+    run["checkpoint"] = {
+        "run_id": run["artifacts"]["run_id"],
+        "page": start_page - 1,
+        "notice_id": None,
+        "full_sweep": full_sweep,
+        "status": "running",
+    }
+    watermark = db_watermark(conn)
+    if not full_sweep and watermark:
+        run["incremental"] = {"watermark": watermark, "k": INCREMENTAL_STOP_PAGES, "stale": set()}
+        print(
+            f"Incremental run: watermark publish_date={watermark['publish_date']}, "
+            f"notice_id={watermark['notice_id']}, stop after {INCREMENTAL_STOP_PAGES} unchanged pages."
+        )
+    else:
+        print("Full sweep run.")
+
+    if FINGERPRINTS:
+        run["fp"] = Fingerprints.open_index()
+        if full_sweep:
+            # a full sweep compares against the DB as it is now
+            n = Fingerprints.rebuild(run["fp"], conn)
+            print(f"Fingerprint index rebuilt from notices_stage ({n} notices).")
+
+    writer = None
+    if DB_WRITER:
+        run["queue"] = asyncio.Queue(maxsize=WRITER_QUEUE_PAGES)
+        writer = run["writer"] = asyncio.create_task(db_writer(conn, run))
+
+    completed = False
+    writer_error = None
+    try:
+        next_page = start_page
+        if SCRAPE_MODE == "http" and not HTTP_ARCHIVE:
+            next_page = await scrape_http(conn, run, next_page)
+        if next_page == start_page and SHARDS > 1 and not HTTP_ARCHIVE:
+            next_page = await scrape_browser_sharded(conn, run, next_page)
+        if next_page is not None:
+            await scrape_browser(conn, run, next_page)
+        completed = True
+
     finally:
-        # always keep a local backup for verification
-        def json_serial(obj):
-            """JSON serializer for objects not serializable by default json code"""
-            if isinstance(obj, (datetime, date)):
-                return obj.isoformat()
-            raise TypeError(f"Type {type(obj)} not serializable")
-
-        with open("notices.json", "w", encoding="utf-8") as f:
-            json.dump(all_rows, f, ensure_ascii=False, indent=2, default=json_serial)
-        print(f"Saved JSON backup with {len(all_rows)} rows.")
-
-        # Summarize all pages
+        # let the writer flush everything still queued
+        if writer is not None:
+            try:
+                await queue_page(run, None)
+                await writer
+            except Exception as e:
+                # pages it had not written yet are lost: not a completed run
+                writer_error = e
+                completed = False
+                print(f"DB writer failed: {e!r}")
+
+        if completed:
+            run["checkpoint"]["status"] = "done"
+            db_state_set(conn, "checkpoint", run["checkpoint"])
+        if full_sweep and completed:
+            db_state_set(conn, "last_full_sweep", datetime.now().isoformat())
+
+        art = run["artifacts"]
+        RunArtifacts.close_run(art)
+        n_rows = art["counts"].get("notices", 0)
+        n_skipped = art["counts"].get("skipped_invalid", 0)
+        print(f"Saved NDJSON backup with {n_rows} rows in {art['dir']}.")
+
+        # Summarize all pages (shards finish out of order)
+        report_pages = sorted(run["pages"], key=lambda p: p["page"])
         tot_inserted  = sum(p["inserted"] for p in report_pages)
         tot_updated   = sum(p["updated"] for p in report_pages)
         tot_unchanged = sum(p["unchanged"] for p in report_pages)
+        tot_local     = sum(run["unchanged_local"].values())
         tot_missing   = sum(len(p.get("ids_missing_after_commit", [])) for p in report_pages)
 
+        # insert_report.json keeps its layout for downstream readers; what
+        # only this scraper knows about the run goes to run.json
         run_report = {
             "total_pages": len(report_pages),
             "inserted": tot_inserted,
@@ -605,35 +1529,43 @@ async def main():
             "unchanged": tot_unchanged,
             "missing_after_commit": tot_missing,
             "pages": report_pages,
-            "skipped_invalid_total": len(skipped_all),
+            "skipped_invalid_total": n_skipped,
         }
         with open("insert_report.json", "w", encoding="utf-8") as f:
             json.dump(run_report, f, ensure_ascii=False, indent=2)
+        RunArtifacts.write_json(art, "insert_report.json", run_report)
+        RunArtifacts.write_json(art, "run.json", {
+            "run_id": art["run_id"],
+            "resumed_from_page": start_page if resume_ck else None,
+            "unchanged_local": tot_local,
+            "unchanged_local_per_page": {str(p): n for p, n in sorted(run["unchanged_local"].items())},
+        })
         print(
             f"Wrote insert_report.json (inserted={tot_inserted}, updated={tot_updated}, "
-            f"unchanged={tot_unchanged}, missing={tot_missing}, skipped_invalid={len(skipped_all)})"
+            f"unchanged={tot_unchanged} ({tot_local} not sent), missing={tot_missing}, "
+            f"skipped_invalid={n_skipped})"
         )
+        if n_skipped:
+            print(f"{n_skipped} rows with missing notice_id in skipped_invalid.ndjson")
 
-        # Flat CSV for easy eyeballing / spreadsheet filtering
-        try:
-            with open("attempts_vs_db.csv", "w", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=["page", "notice_id", "status"])
-                w.writeheader()
-                w.writerows(attempt_rows)
-            print("Wrote attempts_vs_db.csv with per-row statuses.")
-        except Exception as _e:
-            print(f"Could not write attempts_vs_db.csv: {repr(_e)}")
-
-        # Save any skipped-invalid rows (missing PK)
-        if skipped_all:
-            with open("skipped_invalid.json", "w", encoding="utf-8") as f:
-                json.dump(skipped_all, f, ensure_ascii=False, indent=2, default=json_serial)
-            print(f"Wrote skipped_invalid.json — {len(skipped_all)} rows with missing notice_id")
-
+        if "fp" in run:
+            run["fp"].close()
         try:
             conn.close()
         except Exception:
             pass
+    if writer_error is not None:
+        raise writer_error
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    ap = argparse.ArgumentParser(description="Scrape the CVP notice listing into notices_stage.")
+    ap.add_argument("--bench-replay", action="store_true",
+                    help="benchmark listing parsing over the pages archived in HTTP_ARCHIVE_PATH")
+    ap.add_argument("--repeat", type=int, default=5, help="passes per page for --bench-replay")
+    ap.add_argument("--resume", action="store_true",
+                    help="continue the last unfinished run from its checkpoint")
+    args = ap.parse_args()
+    if args.bench_replay:
+        asyncio.run(bench_replay(args.repeat))
+    else:
+        asyncio.run(main(resume=args.resume))
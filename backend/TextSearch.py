@@ -0,0 +1,187 @@
+"""
+Full-text search over the normalized notice texts (TextStore), as an SQLite
+FTS5 index in TEXT_SEARCH_DB.
+
+The unicode61 tokenizer with remove_diacritics=2 folds case and Lithuanian
+diacritics the same way ExtractFromPDFs._strip_diacritics does (NFD, combining
+marks dropped), on both the indexed text and the query: "siauliu" finds
+"Šiaulių". Results are ranked by bm25 and come with a snippet.
+
+ExtractFromPDFs.py indexes every text it stores; `--sync` catches up with
+texts stored before (or by another process), by comparing content hashes.
+
+  python TextSearch.py "statybos darbai"            # notice_ids + snippets
+  python TextSearch.py '"Oficialus pavadinimas" AND vilniaus' --limit 50
+  python TextSearch.py 4523*                        # prefix query
+  python TextSearch.py --sync                       # index new/changed texts
+
+Plain words are matched as-is (every word must occur); queries containing
+quotes, parentheses or AND/OR/NOT/NEAR are passed to FTS5 unchanged.
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import TextStore
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+# "" disables indexing from ExtractFromPDFs.py
+TEXT_SEARCH_DB = os.getenv("TEXT_SEARCH_DB", "pdf_text_fts.sqlite")
+
+INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS docs (
+    id        INTEGER PRIMARY KEY,
+    notice_id TEXT NOT NULL UNIQUE,
+    sha256    TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+FTS_SYNTAX = re.compile(r'["()]|\b(?:AND|OR|NOT|NEAR)\b')
+
+
+def open_index(path: str = TEXT_SEARCH_DB) -> Optional[sqlite3.Connection]:
+    """Index handle, or None if disabled."""
+    if not path:
+        return None
+    idx = sqlite3.connect(path)
+    idx.execute("PRAGMA journal_mode=WAL")
+    idx.execute("PRAGMA synchronous=NORMAL")
+    idx.executescript(INDEX_SQL)
+    idx.commit()
+    return idx
+
+def index_text(idx: sqlite3.Connection, notice_id: str, text: str,
+               sha: Optional[str] = None, commit: bool = True) -> bool:
+    """Add or refresh one notice's text. Returns False if it was already indexed as is."""
+    sha = sha or hashlib.sha256(text.encode("utf-8")).hexdigest()
+    row = idx.execute("SELECT id, sha256 FROM docs WHERE notice_id = ?", (notice_id,)).fetchone()
+    if row and row[1] == sha:
+        return False
+    if row:
+        idx.execute("DELETE FROM fts WHERE rowid = ?", (row[0],))
+        idx.execute("UPDATE docs SET sha256 = ? WHERE id = ?", (sha, row[0]))
+        doc_id = row[0]
+    else:
+        doc_id = idx.execute("INSERT INTO docs (notice_id, sha256) VALUES (?, ?)", (notice_id, sha)).lastrowid
+    idx.execute("INSERT INTO fts (rowid, body) VALUES (?, ?)", (doc_id, text))
+    if commit:
+        idx.commit()
+    return True
+
+def remove(idx: sqlite3.Connection, notice_id: str, commit: bool = True):
+    row = idx.execute("SELECT id FROM docs WHERE notice_id = ?", (notice_id,)).fetchone()
+    if row:
+        idx.execute("DELETE FROM fts WHERE rowid = ?", (row[0],))
+        idx.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+        if commit:
+            idx.commit()
+
+def sync(idx: sqlite3.Connection, store: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Bring the index in line with the TextStore: (re)index texts whose hash
+    differs, drop notices no longer stored. Returns (indexed, removed).
+    """
+    stored = TextStore.hashes(store)
+    known = dict(idx.execute("SELECT notice_id, sha256 FROM docs"))
+    changed = [nid for nid, sha in stored.items() if known.get(nid) != sha]
+    n = 0
+    for notice_id, text in TextStore.iter_texts(store, sorted(changed)):
+        index_text(idx, notice_id, text, stored[notice_id], commit=False)
+        n += 1
+        if n % 1000 == 0:
+            idx.commit()
+    gone = [nid for nid in known if nid not in stored]
+    for notice_id in gone:
+        remove(idx, notice_id, commit=False)
+    if n or gone:
+        idx.execute("INSERT INTO fts (fts) VALUES ('optimize')")
+    idx.commit()
+    return n, len(gone)
+
+# -------------------------------------------------------
+# Querying
+# -------------------------------------------------------
+
+def to_match(query: str) -> str:
+    """FTS5 MATCH expression: plain words are quoted (so '-', '.', ':' are safe), 'word*' stays a prefix."""
+    if FTS_SYNTAX.search(query):
+        return query
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def search(idx: sqlite3.Connection, query: str, limit: int = 20, snippet_tokens: int = 12) -> List[Dict[str, Any]]:
+    """Best matches first: [{"notice_id", "score", "snippet"}]."""
+    match = to_match(query)
+    if not match:
+        return []
+    rows = idx.execute(
+        """
+        SELECT d.notice_id, bm25(fts) AS score,
+               snippet(fts, 0, '[', ']', ' … ', ?)
+        FROM fts JOIN docs d ON d.id = fts.rowid
+        WHERE fts MATCH ?
+        ORDER BY score
+        LIMIT ?
+        """,
+        (snippet_tokens, match, limit),
+    ).fetchall()
+    return [{"notice_id": nid, "score": round(-score, 3), "snippet": " ".join(snip.split())}
+            for nid, score, snip in rows]
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Full-text search over the stored notice texts.")
+    ap.add_argument("query", nargs="*", help="words (diacritics optional) or an FTS5 query")
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--sync", action="store_true", help="index new/changed texts from TEXT_STORE")
+    ap.add_argument("--path", default=TEXT_SEARCH_DB or "pdf_text_fts.sqlite")
+    ap.add_argument("--store", default=TextStore.TEXT_STORE)
+    args = ap.parse_args(argv)
+
+    idx = open_index(args.path)
+    if args.sync:
+        store = TextStore.open_store(args.store)
+        t0 = time.monotonic()
+        n, gone = sync(idx, store)
+        TextStore.close_store(store)
+        total = idx.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        print(f"Indexed {n}, removed {gone} in {time.monotonic() - t0:.1f}s; {total} notices in {args.path}.")
+
+    if args.query:
+        q = " ".join(args.query)
+        t0 = time.perf_counter()
+        try:
+            hits = search(idx, q, args.limit)
+        except sqlite3.OperationalError as e:
+            print(f"Bad query {q!r}: {e}", file=sys.stderr)
+            sys.exit(2)
+        ms = (time.perf_counter() - t0) * 1000
+        for h in hits:
+            print(f"{h['notice_id']:<12}{h['score']:>8.2f}  {h['snippet']}")
+        print(f"{len(hits)} results in {ms:.1f} ms.")
+    idx.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,257 @@
+"""
+Packed store for the normalized notice texts of ExtractFromPDFs.py: one
+SQLite file (TEXT_STORE) instead of a TEXT_DIR/<notice_id>.txt per notice.
+
+Each text is compressed on its own, so any notice can be read directly.
+With the optional `zstandard` package texts are compressed against a
+dictionary trained on the corpus itself (notices share most of their
+boilerplate); without it they are zlib'd. Records remember their codec and
+dictionary, so both kinds can sit in one store.
+
+  python TextStore.py                        # texts, raw vs stored size
+  python TextStore.py --migrate pdf_text     # import a TEXT_DIR (trains the dictionary)
+  python TextStore.py --train                # retrain the dictionary, recompress everything
+  python TextStore.py --export 1269355       # print one text
+  python TextStore.py --dump out_dir         # write everything back as <notice_id>.txt
+"""
+
+import os
+import sys
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import pathlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# -------------------------------------------------------
+# Config
+# -------------------------------------------------------
+
+TEXT_STORE = os.getenv("TEXT_STORE", "pdf_text.sqlite")
+TEXT_STORE_LEVEL = int(os.getenv("TEXT_STORE_LEVEL", "10"))   # zstd level (zlib: capped at 9)
+DICT_SIZE = 112 * 1024
+DICT_MIN_SAMPLES = 100
+
+STORE_SQL = """
+CREATE TABLE IF NOT EXISTS texts (
+    notice_id TEXT PRIMARY KEY,
+    sha256    TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    codec     TEXT NOT NULL,
+    dict_id   INTEGER,
+    data      BLOB NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dicts (
+    id         INTEGER PRIMARY KEY,
+    data       BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def open_store(path: str = TEXT_STORE) -> Dict[str, Any]:
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(STORE_SQL)
+    db.commit()
+    if zstandard is None and db.execute("SELECT 1 FROM texts WHERE codec = 'zstd' LIMIT 1").fetchone():
+        db.close()
+        raise RuntimeError(f"{path} holds zstd-compressed texts; install the `zstandard` package "
+                           "(requirements.txt) to open it")
+    store = {"db": db, "path": path, "dctx": {}, "cctx": None, "dict_id": None}
+    _load_compressor(store)
+    return store
+
+def close_store(store: Dict[str, Any]):
+    store["db"].commit()
+    store["db"].close()
+
+def _load_compressor(store: Dict[str, Any]):
+    """Compress new texts with the newest dictionary (zstd), if there is one."""
+    store["cctx"], store["dict_id"] = None, None
+    if zstandard is None:
+        return
+    row = store["db"].execute("SELECT id, data FROM dicts ORDER BY id DESC LIMIT 1").fetchone()
+    if row:
+        store["dict_id"] = row[0]
+        store["cctx"] = zstandard.ZstdCompressor(
+            level=TEXT_STORE_LEVEL, dict_data=zstandard.ZstdCompressionDict(row[1])
+        )
+    else:
+        store["cctx"] = zstandard.ZstdCompressor(level=TEXT_STORE_LEVEL)
+
+def _decompressor(store: Dict[str, Any], dict_id: Optional[int]):
+    d = store["dctx"].get(dict_id)
+    if d is None:
+        if dict_id is None:
+            d = zstandard.ZstdDecompressor()
+        else:
+            data = store["db"].execute("SELECT data FROM dicts WHERE id = ?", (dict_id,)).fetchone()[0]
+            d = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(data))
+        store["dctx"][dict_id] = d
+    return d
+
+def _encode(store: Dict[str, Any], raw: bytes) -> Tuple[str, Optional[int], bytes]:
+    if store["cctx"] is not None:
+        return "zstd", store["dict_id"], store["cctx"].compress(raw)
+    return "zlib", None, zlib.compress(raw, min(TEXT_STORE_LEVEL, 9))
+
+def _decode(store: Dict[str, Any], codec: str, dict_id: Optional[int], data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("text stored with zstd; install the `zstandard` package to read it")
+        raw = _decompressor(store, dict_id).decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    return raw.decode("utf-8")
+
+# -------------------------------------------------------
+# Reading / writing
+# -------------------------------------------------------
+
+def put(store: Dict[str, Any], notice_id: str, text: str, commit: bool = True) -> str:
+    """Store (or replace) one notice's text. Returns its sha256."""
+    raw = text.encode("utf-8")
+    sha = hashlib.sha256(raw).hexdigest()
+    codec, dict_id, data = _encode(store, raw)
+    store["db"].execute(
+        "INSERT OR REPLACE INTO texts (notice_id, sha256, size, codec, dict_id, data, stored_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (notice_id, sha, len(raw), codec, dict_id, data, datetime.now().isoformat(timespec="seconds")),
+    )
+    if commit:
+        store["db"].commit()
+    return sha
+
+def get(store: Dict[str, Any], notice_id: str) -> Optional[str]:
+    row = store["db"].execute(
+        "SELECT codec, dict_id, data FROM texts WHERE notice_id = ?", (notice_id,)
+    ).fetchone()
+    return _decode(store, *row) if row else None
+
+def iter_texts(store: Dict[str, Any], ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str]]:
+    """(notice_id, text) for `ids` (those present), or for every text in notice_id order."""
+    if ids is not None:
+        for notice_id in ids:
+            text = get(store, notice_id)
+            if text is not None:
+                yield notice_id, text
+        return
+    # separate cursor: callers may write to the store while iterating
+    cur = store["db"].cursor()
+    for notice_id, codec, dict_id, data in cur.execute(
+        "SELECT notice_id, codec, dict_id, data FROM texts ORDER BY notice_id"
+    ):
+        yield notice_id, _decode(store, codec, dict_id, data)
+
+def hashes(store: Dict[str, Any]) -> Dict[str, str]:
+    """notice_id -> sha256 of its text, without decompressing anything."""
+    return dict(store["db"].execute("SELECT notice_id, sha256 FROM texts"))
+
+def count(store: Dict[str, Any]) -> int:
+    return store["db"].execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+
+def stats(store: Dict[str, Any]) -> Dict[str, Any]:
+    n, raw, stored = store["db"].execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM texts"
+    ).fetchone()
+    dicts = store["db"].execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM dicts").fetchone()
+    return {"texts": n, "raw_bytes": raw, "stored_bytes": stored,
+            "dicts": dicts[0], "dict_bytes": dicts[1], "file_bytes": os.path.getsize(store["path"])}
+
+# -------------------------------------------------------
+# Dictionary / migration
+# -------------------------------------------------------
+
+def train(store: Dict[str, Any], recompress: bool = True) -> Optional[int]:
+    """
+    Train a new zstd dictionary on the stored texts and (by default)
+    recompress every text with it. Returns the dictionary id, or None when
+    zstandard is missing or there are too few texts.
+    """
+    if zstandard is None or count(store) < DICT_MIN_SAMPLES:
+        return None
+    samples = [t.encode("utf-8") for _, t in iter_texts(store)]
+    d = zstandard.train_dictionary(DICT_SIZE, samples)
+    cur = store["db"].execute(
+        "INSERT INTO dicts (data, created_at) VALUES (?, ?)",
+        (d.as_bytes(), datetime.now().isoformat(timespec="seconds")),
+    )
+    store["db"].commit()
+    _load_compressor(store)
+    if recompress:
+        for notice_id, text in list(iter_texts(store)):
+            put(store, notice_id, text, commit=False)
+        store["db"].commit()
+        store["db"].execute("VACUUM")
+        store["db"].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return cur.lastrowid
+
+def migrate_dir(store: Dict[str, Any], text_dir: str) -> int:
+    """Import every <notice_id>.txt of a TEXT_DIR (then train the dictionary). Returns the count."""
+    n = 0
+    for p in sorted(pathlib.Path(text_dir).glob("*.txt")):
+        put(store, p.stem, p.read_text(encoding="utf-8"), commit=False)
+        n += 1
+        if n % 1000 == 0:
+            store["db"].commit()
+    store["db"].commit()
+    if n and store["dict_id"] is None:
+        train(store)
+    return n
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Inspect/migrate the packed notice text store.")
+    ap.add_argument("--path", default=TEXT_STORE)
+    ap.add_argument("--migrate", metavar="TEXT_DIR", help="import <notice_id>.txt files from a directory")
+    ap.add_argument("--train", action="store_true", help="retrain the zstd dictionary and recompress")
+    ap.add_argument("--export", metavar="NOTICE_ID", help="print one text")
+    ap.add_argument("--dump", metavar="DIR", help="write every text to DIR/<notice_id>.txt")
+    args = ap.parse_args(argv)
+
+    store = open_store(args.path)
+    try:
+        if args.export:
+            text = get(store, args.export)
+            if text is None:
+                print(f"{args.export}: not in {args.path}", file=sys.stderr)
+                sys.exit(1)
+            sys.stdout.write(text)
+            return
+        if args.migrate:
+            print(f"Imported {migrate_dir(store, args.migrate)} texts from {args.migrate}.")
+        if args.train:
+            dict_id = train(store)
+            print(f"Trained dictionary {dict_id}." if dict_id else "Not trained (zstandard missing or too few texts).")
+        if args.dump:
+            os.makedirs(args.dump, exist_ok=True)
+            n = 0
+            for notice_id, text in iter_texts(store):
+                with open(os.path.join(args.dump, f"{notice_id}.txt"), "w", encoding="utf-8") as f:
+                    f.write(text)
+                n += 1
+            print(f"Wrote {n} texts to {args.dump}.")
+        st = stats(store)
+        ratio = st["raw_bytes"] / max(1, st["stored_bytes"] + st["dict_bytes"])
+        print(f"{args.path}: {st['texts']} texts, {st['raw_bytes'] / 1e6:.1f} MB raw, "
+              f"{(st['stored_bytes'] + st['dict_bytes']) / 1e6:.1f} MB stored ({ratio:.1f}x), "
+              f"file {st['file_bytes'] / 1e6:.1f} MB")
+    finally:
+        close_store(store)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])